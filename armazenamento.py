@@ -0,0 +1,861 @@
+# armazenamento.py
+
+import bisect
+import hashlib
+import itertools
+import os
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from slugify import slugify
+
+# Campos gravados para cada imóvel, na ordem das colunas da tabela (sem o id)
+CAMPOS_IMOVEL = (
+    "id_lote",
+    "estado",
+    "cidade",
+    "endereco",
+    "matricula",
+    "valor_1_leilao",
+    "valor_2_leilao",
+    "provisao",
+    "origem_edital",
+    "status",
+)
+# Campos que podem ser pedidos em uma listagem
+CAMPOS_CONSULTA = ("id",) + CAMPOS_IMOVEL
+# Campos atualizados quando um imóvel já gravado reaparece em outro edital (o status,
+# controlado pelo usuário, é mantido)
+CAMPOS_ATUALIZAVEIS = tuple(campo for campo in CAMPOS_IMOVEL if campo != "status")
+# Campos de texto com poucos valores distintos entre os imóveis (ver RegistroImovel)
+CAMPOS_INTERNADOS = ("estado", "cidade", "origem_edital", "status")
+# Campos de cada entrada do histórico de preços de um imóvel
+CAMPOS_HISTORICO = ("valor_1_leilao", "valor_2_leilao", "provisao", "origem_edital", "registrado_em")
+CAMPOS_PRECO = ("valor_1_leilao", "valor_2_leilao", "provisao")
+# Chaves consultadas por comando no SQLite (abaixo do limite de parâmetros)
+TAMANHO_BLOCO_CONSULTA = 500
+
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _normalizar_texto(texto: Optional[str]) -> str:
+    sem_acentos = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^0-9A-Za-z]+", " ", sem_acentos).upper().split())
+
+
+def chave_imovel(dados: dict) -> str:
+    """
+    Identifica o mesmo imóvel em editais e meses diferentes: pela matrícula e cidade
+    ou, quando a matrícula falta (ou não tem nenhum dígito, caso em que é um pedaço do
+    endereço lido por engano), pelo estado, cidade e endereço normalizados. Acentos,
+    pontuação, espaços e maiúsculas não contam. Retorna um hash de tamanho fixo.
+    """
+    cidade = _normalizar_texto(dados.get("cidade"))
+    matricula = _normalizar_texto(dados.get("matricula")).replace(" ", "").lstrip("0")
+    if any(caractere.isdigit() for caractere in matricula):
+        base = f"matricula|{cidade}|{matricula}"
+    else:
+        base = f"endereco|{_normalizar_texto(dados.get('estado'))}|{cidade}|{_normalizar_texto(dados.get('endereco'))}"
+    return hashlib.blake2b(base.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _montar_registro(imovel_id: int, dados: dict) -> dict:
+    imovel = {"id": imovel_id, **{campo: dados.get(campo) for campo in CAMPOS_IMOVEL}}
+    imovel["status"] = dados.get("status") or "novo"
+    return imovel
+
+
+def _entrada_historico(imovel: dict, registrado_em: str) -> tuple:
+    # Valores na ordem de CAMPOS_HISTORICO
+    return (*(imovel[campo] for campo in CAMPOS_HISTORICO[:-1]), registrado_em)
+
+
+def _agrupar_por_chave(registros: List[dict]) -> Dict[str, dict]:
+    # Se o mesmo imóvel aparece mais de uma vez no lote, vale a última ocorrência
+    return {chave_imovel(dados): dados for dados in registros}
+
+
+def _alteracoes(imovel: dict, dados: dict) -> dict:
+    novos_valores = {campo: dados.get(campo) for campo in CAMPOS_ATUALIZAVEIS}
+    return {campo: valor for campo, valor in novos_valores.items() if imovel[campo] != valor}
+
+
+def tokenizar(texto: Optional[str]) -> List[str]:
+    """
+    Divide o texto em termos de busca: sem acentos, em minúsculas e sem pontuação
+    ("Rua São João, 12" -> ["rua", "sao", "joao", "12"]). Usada tanto ao indexar o
+    endereço dos imóveis quanto ao ler a consulta.
+    """
+    return slugify(texto or "", separator=" ").split()
+
+
+class _IndiceInvertido:
+    """
+    Índice invertido em memória: para cada termo, os ids dos imóveis que o contêm. Os
+    termos também ficam em uma lista ordenada, para que um termo da consulta encontre
+    todos os que começam com ele ("apart" -> "apartamento").
+    """
+
+    def __init__(self):
+        self._ids_por_termo: Dict[str, Set[int]] = {}
+        self._termos: List[str] = []
+
+    def adicionar(self, imovel_id: int, texto: Optional[str]):
+        for termo in set(tokenizar(texto)):
+            ids = self._ids_por_termo.get(termo)
+            if ids is None:
+                ids = self._ids_por_termo[termo] = set()
+                bisect.insort(self._termos, termo)
+            ids.add(imovel_id)
+
+    def remover(self, imovel_id: int, texto: Optional[str]):
+        for termo in set(tokenizar(texto)):
+            ids = self._ids_por_termo.get(termo)
+            if ids is not None:
+                ids.discard(imovel_id)
+                if not ids:
+                    del self._ids_por_termo[termo]
+                    del self._termos[bisect.bisect_left(self._termos, termo)]
+
+    def buscar(self, termos: Iterable[str]) -> Set[int]:
+        resultado: Optional[Set[int]] = None
+        for termo in termos:
+            ids = set()
+            inicio = bisect.bisect_left(self._termos, termo)
+            for termo_indice in itertools.islice(self._termos, inicio, None):
+                if not termo_indice.startswith(termo):
+                    break
+                ids |= self._ids_por_termo[termo_indice]
+            resultado = ids if resultado is None else resultado & ids
+            if not resultado:
+                return set()
+        return resultado if resultado is not None else set()
+
+
+@dataclass
+class ResultadoBusca:
+    """
+    Resultado de ArmazenamentoImoveis.buscar: a página de imóveis, o total de imóveis
+    encontrados e a quantidade por cidade (estado, cidade, quantidade), da maior para
+    a menor.
+    """
+
+    imoveis: List[dict]
+    total: int
+    facetas_cidade: List[dict]
+
+
+def _facetas_cidade(contagem: Counter) -> List[dict]:
+    return [
+        {"estado": estado, "cidade": cidade, "quantidade": quantidade}
+        for (estado, cidade), quantidade in sorted(contagem.items(), key=lambda item: (-item[1], item[0][0] or "", item[0][1] or ""))
+    ]
+
+
+@dataclass
+class ResultadoGravacao:
+    """
+    Resultado de ArmazenamentoImoveis.gravar_lote: imóveis inseridos, imóveis já
+    existentes que mudaram (com os valores atuais) e quantos chegaram sem mudança.
+    """
+
+    novos: List[dict] = field(default_factory=list)
+    atualizados: List[dict] = field(default_factory=list)
+    inalterados: int = 0
+
+
+def _internar(campo: str, valor):
+    if campo in CAMPOS_INTERNADOS and isinstance(valor, str):
+        return sys.intern(valor)
+    return valor
+
+
+class RegistroImovel:
+    """
+    Imóvel guardado pelo ArmazenamentoMemoria. Os campos ficam em __slots__, sem um
+    dicionário por imóvel, e os textos de CAMPOS_INTERNADOS são internados: cada estado,
+    cidade, edital ou status distinto fica uma única vez na memória, não uma vez por
+    imóvel. Os campos também podem ser lidos como em um dicionário (imovel["cidade"]).
+    """
+
+    __slots__ = CAMPOS_CONSULTA
+
+    def __init__(self, imovel: dict):
+        for campo in CAMPOS_CONSULTA:
+            setattr(self, campo, _internar(campo, imovel[campo]))
+
+    def __getitem__(self, campo: str):
+        return getattr(self, campo)
+
+    def atualizar(self, alteracoes: dict):
+        for campo, valor in alteracoes.items():
+            setattr(self, campo, _internar(campo, valor))
+
+    def como_dict(self, campos: Sequence[str] = CAMPOS_CONSULTA) -> dict:
+        return {campo: getattr(self, campo) for campo in campos}
+
+
+def _campos_retorno(campos: Optional[Sequence[str]]) -> List[str]:
+    if not campos:
+        return list(CAMPOS_CONSULTA)
+    campos_invalidos = set(campos) - set(CAMPOS_CONSULTA)
+    if campos_invalidos:
+        raise ValueError(f"Campos desconhecidos: {', '.join(sorted(campos_invalidos))}")
+    # O id é sempre retornado, pois é o cursor da paginação
+    return ["id"] + [campo for campo in CAMPOS_CONSULTA if campo in campos and campo != "id"]
+
+
+class ArmazenamentoImoveis(ABC):
+    """
+    Interface do armazenamento dos imóveis usada pela API.
+
+    Os imóveis circulam como dicionários com a chave "id" e os campos de CAMPOS_IMOVEL;
+    a validação fica a cargo do modelo Pydantic da API.
+    """
+
+    @abstractmethod
+    def inserir_lote(self, registros: List[dict]) -> List[dict]:
+        """
+        Grava vários imóveis de uma vez, atomicamente, e retorna os registros gravados.
+        Os ids vêm de um contador crescente: nunca são repetidos, mesmo com gravações
+        simultâneas ou depois de remoções.
+        """
+
+    def inserir(self, dados: dict) -> dict:
+        """Grava um novo imóvel, atribuindo o id, e retorna o registro gravado."""
+        return self.inserir_lote([dados])[0]
+
+    @abstractmethod
+    def gravar_lote(self, registros: List[dict]) -> ResultadoGravacao:
+        """
+        Grava os imóveis de uma execução da automação, atomicamente, sem duplicar os que
+        já existem (ver chave_imovel). Um imóvel novo é inserido; um já gravado mantém o
+        id e o status e só é atualizado se algum campo mudou. Cada inserção ou mudança de
+        preço acrescenta uma entrada ao histórico de preços do imóvel. O trabalho (e o
+        espaço) cresce com os imóveis novos ou alterados, não com o total já gravado.
+        """
+
+    @abstractmethod
+    def historico_precos(self, imovel_id: int) -> Optional[List[dict]]:
+        """
+        Retorna as entradas de preço do imóvel, da mais antiga para a mais recente,
+        com os campos de CAMPOS_HISTORICO, ou None se o imóvel não existir.
+        """
+
+    @abstractmethod
+    def versao(self) -> int:
+        """
+        Número que muda sempre que algum imóvel é inserido, alterado ou removido. A API
+        o usa para saber se uma listagem já serializada ainda vale (ver cache_respostas).
+        """
+
+    @abstractmethod
+    def obter(self, imovel_id: int) -> Optional[dict]:
+        """Retorna o imóvel com o id informado, ou None se não existir."""
+
+    @abstractmethod
+    def listar(
+        self,
+        status: Optional[str] = None,
+        estado: Optional[str] = None,
+        cidade: Optional[str] = None,
+        origem_edital: Optional[str] = None,
+        provisao_min: Optional[float] = None,
+        provisao_max: Optional[float] = None,
+        apos_id: Optional[int] = None,
+        limite: Optional[int] = None,
+        campos: Optional[Sequence[str]] = None,
+    ) -> List[dict]:
+        """
+        Lista os imóveis em ordem de id, aplicando os filtros informados.
+
+        A paginação é por chave: `apos_id` é o último id da página anterior. Com `campos`,
+        cada registro traz apenas esses campos (além do id, sempre presente).
+        """
+
+    @abstractmethod
+    def buscar(
+        self,
+        texto: Optional[str] = None,
+        status: Optional[str] = None,
+        estado: Optional[str] = None,
+        cidade: Optional[str] = None,
+        provisao_min: Optional[float] = None,
+        provisao_max: Optional[float] = None,
+        apos_id: Optional[int] = None,
+        limite: Optional[int] = None,
+        campos: Optional[Sequence[str]] = None,
+    ) -> ResultadoBusca:
+        """
+        Busca os imóveis cujo endereço contém todos os termos de `texto` (ver tokenizar;
+        cada termo vale como prefixo), combinados com os filtros de `listar`.
+
+        A página segue as regras de `listar` (ordem de id, `apos_id`, `limite`, `campos`);
+        o total e as facetas por cidade consideram todos os imóveis encontrados.
+        """
+
+    def iterar_paginas(self, tamanho_pagina: int = 1000, limite: Optional[int] = None, **filtros) -> Iterator[List[dict]]:
+        """
+        Percorre, página a página, os imóveis que atendem aos filtros de `listar`, sem
+        carregar o resultado inteiro em memória.
+        """
+        apos_id = filtros.pop("apos_id", None)
+        while limite is None or limite > 0:
+            tamanho = tamanho_pagina if limite is None else min(tamanho_pagina, limite)
+            pagina = self.listar(apos_id=apos_id, limite=tamanho, **filtros)
+            if pagina:
+                yield pagina
+            if len(pagina) < tamanho:
+                return
+            apos_id = pagina[-1]["id"]
+            if limite is not None:
+                limite -= len(pagina)
+
+
+class ArmazenamentoMemoria(ArmazenamentoImoveis):
+    """
+    Armazenamento em um dicionário do processo. Os dados se perdem ao reiniciar e não
+    são compartilhados entre workers; útil para testes e execuções avulsas.
+
+    Os imóveis são guardados como RegistroImovel e as entradas do histórico como tuplas
+    na ordem de CAMPOS_HISTORICO; os dicionários são montados só na leitura.
+    """
+
+    def __init__(self):
+        self._imoveis: Dict[int, RegistroImovel] = {}
+        # Ids em ordem crescente, para a listagem começar direto no cursor
+        self._ids: List[int] = []
+        self._proximo_id = itertools.count(1)
+        self._lock = threading.Lock()
+        # Índice de chave_imovel -> id e histórico de preços de cada imóvel
+        self._ids_por_chave: Dict[str, int] = {}
+        self._historico: Dict[int, List[tuple]] = {}
+        # Número de alterações feitas (ver versao)
+        self._versao = 0
+        # Termos do endereço de cada imóvel, para a busca
+        self._indice_busca = _IndiceInvertido()
+
+    def _inserir(self, chave: str, dados: dict, registrado_em: str) -> dict:
+        imovel = RegistroImovel(_montar_registro(next(self._proximo_id), dados))
+        self._imoveis[imovel.id] = imovel
+        # Os ids são entregues em ordem crescente, então a lista continua ordenada
+        self._ids.append(imovel.id)
+        self._indice_busca.adicionar(imovel.id, imovel.endereco)
+        self._ids_por_chave.setdefault(chave, imovel.id)
+        self._historico[imovel.id] = [_entrada_historico(imovel, registrado_em)]
+        return imovel.como_dict()
+
+    def inserir_lote(self, registros: List[dict]) -> List[dict]:
+        registrado_em = _agora()
+        with self._lock:
+            imoveis = [self._inserir(chave_imovel(dados), dados, registrado_em) for dados in registros]
+            if imoveis:
+                self._versao += 1
+        return imoveis
+
+    def gravar_lote(self, registros: List[dict]) -> ResultadoGravacao:
+        resultado = ResultadoGravacao()
+        registrado_em = _agora()
+        with self._lock:
+            for chave, dados in _agrupar_por_chave(registros).items():
+                imovel = self._imoveis.get(self._ids_por_chave.get(chave))
+                if imovel is None:
+                    resultado.novos.append(self._inserir(chave, dados, registrado_em))
+                    continue
+                alteracoes = _alteracoes(imovel, dados)
+                if not alteracoes:
+                    resultado.inalterados += 1
+                    continue
+                if "endereco" in alteracoes:
+                    self._indice_busca.remover(imovel.id, imovel.endereco)
+                    self._indice_busca.adicionar(imovel.id, alteracoes["endereco"])
+                imovel.atualizar(alteracoes)
+                if alteracoes.keys() & set(CAMPOS_PRECO):
+                    self._historico[imovel.id].append(_entrada_historico(imovel, registrado_em))
+                resultado.atualizados.append(imovel.como_dict())
+            if resultado.novos or resultado.atualizados:
+                self._versao += 1
+        return resultado
+
+    def historico_precos(self, imovel_id: int) -> Optional[List[dict]]:
+        historico = self._historico.get(imovel_id)
+        return [dict(zip(CAMPOS_HISTORICO, entrada)) for entrada in historico] if historico is not None else None
+
+    def versao(self) -> int:
+        return self._versao
+
+    def obter(self, imovel_id: int) -> Optional[dict]:
+        imovel = self._imoveis.get(imovel_id)
+        return imovel.como_dict() if imovel else None
+
+    def listar(
+        self,
+        status: Optional[str] = None,
+        estado: Optional[str] = None,
+        cidade: Optional[str] = None,
+        origem_edital: Optional[str] = None,
+        provisao_min: Optional[float] = None,
+        provisao_max: Optional[float] = None,
+        apos_id: Optional[int] = None,
+        limite: Optional[int] = None,
+        campos: Optional[Sequence[str]] = None,
+    ) -> List[dict]:
+        filtros_exatos = {"status": status, "estado": estado, "cidade": cidade, "origem_edital": origem_edital}
+        filtros_exatos = {campo: valor for campo, valor in filtros_exatos.items() if valor is not None}
+        campos_retorno = _campos_retorno(campos)
+
+        resultado = []
+        with self._lock:
+            # Cada página começa no primeiro id depois do cursor, sem percorrer as anteriores
+            inicio = bisect.bisect_right(self._ids, apos_id) if apos_id is not None else 0
+            for indice in range(inicio, len(self._ids)):
+                if limite is not None and len(resultado) >= limite:
+                    break
+                imovel = self._imoveis[self._ids[indice]]
+                if any(getattr(imovel, campo) != valor for campo, valor in filtros_exatos.items()):
+                    continue
+                if provisao_min is not None and imovel.provisao < provisao_min:
+                    continue
+                if provisao_max is not None and imovel.provisao > provisao_max:
+                    continue
+                resultado.append(imovel.como_dict(campos_retorno))
+        return resultado
+
+    def buscar(
+        self,
+        texto: Optional[str] = None,
+        status: Optional[str] = None,
+        estado: Optional[str] = None,
+        cidade: Optional[str] = None,
+        provisao_min: Optional[float] = None,
+        provisao_max: Optional[float] = None,
+        apos_id: Optional[int] = None,
+        limite: Optional[int] = None,
+        campos: Optional[Sequence[str]] = None,
+    ) -> ResultadoBusca:
+        filtros_exatos = {"status": status, "estado": estado, "cidade": cidade}
+        filtros_exatos = {campo: valor for campo, valor in filtros_exatos.items() if valor is not None}
+        campos_retorno = _campos_retorno(campos)
+        termos = tokenizar(texto)
+
+        with self._lock:
+            ids = self._indice_busca.buscar(termos) if termos else self._imoveis.keys()
+            encontrados = []
+            for imovel_id in ids:
+                imovel = self._imoveis.get(imovel_id)
+                if imovel is None or any(getattr(imovel, campo) != valor for campo, valor in filtros_exatos.items()):
+                    continue
+                if provisao_min is not None and imovel.provisao < provisao_min:
+                    continue
+                if provisao_max is not None and imovel.provisao > provisao_max:
+                    continue
+                encontrados.append(imovel)
+
+        pagina = sorted(
+            (imovel for imovel in encontrados if apos_id is None or imovel.id > apos_id), key=lambda imovel: imovel.id
+        )[:limite]
+        return ResultadoBusca(
+            imoveis=[imovel.como_dict(campos_retorno) for imovel in pagina],
+            total=len(encontrados),
+            facetas_cidade=_facetas_cidade(Counter((imovel.estado, imovel.cidade) for imovel in encontrados)),
+        )
+
+    def atualizar_status(self, imovel_id: int, status: str) -> Optional[dict]:
+        with self._lock:
+            imovel = self._imoveis.get(imovel_id)
+            if imovel is None:
+                return None
+            imovel.atualizar({"status": status})
+            self._versao += 1
+            return imovel.como_dict()
+
+    def remover(self, imovel_id: int) -> bool:
+        with self._lock:
+            imovel = self._imoveis.pop(imovel_id, None)
+            if imovel is None:
+                return False
+            del self._ids[bisect.bisect_left(self._ids, imovel_id)]
+            self._historico.pop(imovel_id, None)
+            self._indice_busca.remover(imovel_id, imovel.endereco)
+            chave = chave_imovel(imovel.como_dict())
+            if self._ids_por_chave.get(chave) == imovel_id:
+                del self._ids_por_chave[chave]
+            self._versao += 1
+            return True
+
+
+class ArmazenamentoSQLite(ArmazenamentoImoveis):
+    """
+    Armazenamento em um arquivo SQLite local, compartilhado por todos os workers do uvicorn.
+
+    O banco usa WAL, então as leituras da API não ficam bloqueadas enquanto a automação
+    grava novos imóveis. Cada thread usa sua própria conexão.
+
+    A coluna `chave` (ver chave_imovel) é indexada, então gravar_lote encontra os imóveis
+    já existentes com uma consulta por bloco de chaves, sem percorrer a tabela.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._criar_tabelas()
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conexao.row_factory = sqlite3.Row
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+        return conexao
+
+    def _criar_tabelas(self):
+        conexao = self._conexao()
+        conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS imoveis (
+                id INTEGER PRIMARY KEY,
+                id_lote INTEGER,
+                estado TEXT,
+                cidade TEXT,
+                endereco TEXT NOT NULL,
+                matricula TEXT,
+                valor_1_leilao REAL NOT NULL,
+                valor_2_leilao REAL NOT NULL,
+                provisao REAL NOT NULL,
+                origem_edital TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'novo',
+                chave TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_imoveis_status ON imoveis (status, id);
+            CREATE INDEX IF NOT EXISTS idx_imoveis_origem_edital ON imoveis (origem_edital);
+            CREATE INDEX IF NOT EXISTS idx_imoveis_matricula ON imoveis (matricula);
+            CREATE INDEX IF NOT EXISTS idx_imoveis_estado_cidade ON imoveis (estado, cidade);
+            CREATE INDEX IF NOT EXISTS idx_imoveis_cidade ON imoveis (cidade);
+            CREATE INDEX IF NOT EXISTS idx_imoveis_provisao ON imoveis (provisao);
+
+            -- Preços de cada imóvel ao longo dos editais em que apareceu
+            CREATE TABLE IF NOT EXISTS historico_precos (
+                imovel_id INTEGER NOT NULL,
+                valor_1_leilao REAL NOT NULL,
+                valor_2_leilao REAL NOT NULL,
+                provisao REAL NOT NULL,
+                origem_edital TEXT NOT NULL,
+                registrado_em TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_historico_precos_imovel ON historico_precos (imovel_id);
+
+            -- Último id entregue para cada tabela
+            CREATE TABLE IF NOT EXISTS contadores (
+                nome TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO contadores (nome, valor)
+                SELECT 'imoveis', COALESCE(MAX(id), 0) FROM imoveis;
+            -- Alterações feitas nos imóveis (ver versao)
+            INSERT OR IGNORE INTO contadores (nome, valor) VALUES ('versao', 0);
+        """)
+        if not self._tem_coluna_chave(conexao):
+            self._migrar_chaves(conexao)
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_imoveis_chave ON imoveis (chave)")
+        self._criar_indice_busca(conexao)
+
+    def _criar_indice_busca(self, conexao: sqlite3.Connection):
+        # Índice FTS5 com os termos do endereço de cada imóvel (ver tokenizar), com o id
+        # do imóvel como rowid. Bancos que já tinham imóveis são indexados na criação
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            existe = conexao.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'imoveis_busca'"
+            ).fetchone()
+            if not existe:
+                conexao.execute("CREATE VIRTUAL TABLE imoveis_busca USING fts5(termos, tokenize = 'unicode61', prefix = '2 3 4')")
+                self._indexar_busca(conexao, [dict(linha) for linha in conexao.execute("SELECT id, endereco FROM imoveis")])
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _indexar_busca(conexao: sqlite3.Connection, imoveis: List[dict]):
+        conexao.executemany(
+            "INSERT INTO imoveis_busca (rowid, termos) VALUES (?, ?)",
+            ((imovel["id"], " ".join(tokenizar(imovel["endereco"]))) for imovel in imoveis),
+        )
+
+    @staticmethod
+    def _tem_coluna_chave(conexao: sqlite3.Connection) -> bool:
+        return any(linha["name"] == "chave" for linha in conexao.execute("PRAGMA table_info(imoveis)"))
+
+    def _migrar_chaves(self, conexao: sqlite3.Connection):
+        # Bancos criados antes da deduplicação: calcula a chave dos imóveis já gravados e
+        # usa os valores atuais como primeira entrada do histórico
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            if self._tem_coluna_chave(conexao):
+                # Outro processo fez a migração enquanto esperávamos a vez de escrever
+                conexao.execute("ROLLBACK")
+                return
+            conexao.execute("ALTER TABLE imoveis ADD COLUMN chave TEXT")
+            linhas = [dict(linha) for linha in conexao.execute("SELECT * FROM imoveis")]
+            conexao.executemany(
+                "UPDATE imoveis SET chave = ? WHERE id = ?", ((chave_imovel(linha), linha["id"]) for linha in linhas)
+            )
+            self._inserir_historico(conexao, linhas, _agora())
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+
+    @contextmanager
+    def _transacao(self) -> Iterator[sqlite3.Connection]:
+        conexao = self._conexao()
+        # BEGIN IMMEDIATE reserva a escrita logo no início: duas ingestões simultâneas
+        # (inclusive de outros processos) esperam uma pela outra em vez de repetir ids
+        # ou inserir o mesmo imóvel duas vezes
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexao
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _registrar_alteracao(conexao: sqlite3.Connection):
+        conexao.execute("UPDATE contadores SET valor = valor + 1 WHERE nome = 'versao'")
+
+    def _inserir_historico(self, conexao: sqlite3.Connection, imoveis: List[dict], registrado_em: str):
+        conexao.executemany(
+            f"INSERT INTO historico_precos (imovel_id, {', '.join(CAMPOS_HISTORICO)}) VALUES (?{', ?' * len(CAMPOS_HISTORICO)})",
+            ([imovel["id"], *_entrada_historico(imovel, registrado_em)] for imovel in imoveis),
+        )
+
+    def _inserir_novos(self, conexao: sqlite3.Connection, itens: List[Tuple[str, dict]], registrado_em: str) -> List[dict]:
+        if not itens:
+            return []
+        self._registrar_alteracao(conexao)
+        conexao.execute("UPDATE contadores SET valor = valor + ? WHERE nome = 'imoveis'", (len(itens),))
+        ultimo_id = conexao.execute("SELECT valor FROM contadores WHERE nome = 'imoveis'").fetchone()[0]
+        primeiro_id = ultimo_id - len(itens) + 1
+
+        imoveis = [_montar_registro(primeiro_id + i, dados) for i, (_, dados) in enumerate(itens)]
+        conexao.executemany(
+            f"INSERT INTO imoveis (id, {', '.join(CAMPOS_IMOVEL)}, chave) VALUES (?{', ?' * len(CAMPOS_IMOVEL)}, ?)",
+            ([imovel["id"], *(imovel[campo] for campo in CAMPOS_IMOVEL), chave] for imovel, (chave, _) in zip(imoveis, itens)),
+        )
+        self._inserir_historico(conexao, imoveis, registrado_em)
+        self._indexar_busca(conexao, imoveis)
+        return imoveis
+
+    def inserir_lote(self, registros: List[dict]) -> List[dict]:
+        if not registros:
+            return []
+        with self._transacao() as conexao:
+            return self._inserir_novos(conexao, [(chave_imovel(dados), dados) for dados in registros], _agora())
+
+    def _buscar_por_chaves(self, conexao: sqlite3.Connection, chaves: List[str]) -> Dict[str, dict]:
+        existentes = {}
+        for inicio in range(0, len(chaves), TAMANHO_BLOCO_CONSULTA):
+            bloco = chaves[inicio:inicio + TAMANHO_BLOCO_CONSULTA]
+            # Em ordem decrescente de id: se houver mais de um imóvel com a mesma chave
+            # (gravados antes da deduplicação), fica o mais antigo
+            linhas = conexao.execute(
+                f"SELECT chave, {', '.join(CAMPOS_CONSULTA)} FROM imoveis "
+                f"WHERE chave IN ({', '.join('?' * len(bloco))}) ORDER BY id DESC",
+                bloco,
+            )
+            for linha in linhas:
+                imovel = dict(linha)
+                existentes[imovel.pop("chave")] = imovel
+        return existentes
+
+    def gravar_lote(self, registros: List[dict]) -> ResultadoGravacao:
+        resultado = ResultadoGravacao()
+        grupos = _agrupar_por_chave(registros)
+        if not grupos:
+            return resultado
+        registrado_em = _agora()
+
+        with self._transacao() as conexao:
+            existentes = self._buscar_por_chaves(conexao, list(grupos))
+            resultado.novos = self._inserir_novos(
+                conexao, [(chave, dados) for chave, dados in grupos.items() if chave not in existentes], registrado_em
+            )
+
+            mudancas_preco, mudancas_endereco = [], []
+            for chave, dados in grupos.items():
+                imovel = existentes.get(chave)
+                if imovel is None:
+                    continue
+                alteracoes = _alteracoes(imovel, dados)
+                if not alteracoes:
+                    resultado.inalterados += 1
+                    continue
+                imovel.update(alteracoes)
+                resultado.atualizados.append(imovel)
+                if alteracoes.keys() & set(CAMPOS_PRECO):
+                    mudancas_preco.append(imovel)
+                if "endereco" in alteracoes:
+                    mudancas_endereco.append(imovel)
+            if resultado.atualizados:
+                self._registrar_alteracao(conexao)
+            conexao.executemany(
+                f"UPDATE imoveis SET {', '.join(f'{campo} = ?' for campo in CAMPOS_ATUALIZAVEIS)} WHERE id = ?",
+                ([*(imovel[campo] for campo in CAMPOS_ATUALIZAVEIS), imovel["id"]] for imovel in resultado.atualizados),
+            )
+            self._inserir_historico(conexao, mudancas_preco, registrado_em)
+            conexao.executemany("DELETE FROM imoveis_busca WHERE rowid = ?", ((imovel["id"],) for imovel in mudancas_endereco))
+            self._indexar_busca(conexao, mudancas_endereco)
+        return resultado
+
+    def historico_precos(self, imovel_id: int) -> Optional[List[dict]]:
+        conexao = self._conexao()
+        if conexao.execute("SELECT 1 FROM imoveis WHERE id = ?", (imovel_id,)).fetchone() is None:
+            return None
+        linhas = conexao.execute(
+            f"SELECT {', '.join(CAMPOS_HISTORICO)} FROM historico_precos WHERE imovel_id = ? ORDER BY rowid",
+            (imovel_id,),
+        )
+        return [dict(linha) for linha in linhas]
+
+    def versao(self) -> int:
+        return self._conexao().execute("SELECT valor FROM contadores WHERE nome = 'versao'").fetchone()[0]
+
+    def obter(self, imovel_id: int) -> Optional[dict]:
+        linha = self._conexao().execute(f"SELECT {', '.join(CAMPOS_CONSULTA)} FROM imoveis WHERE id = ?", (imovel_id,)).fetchone()
+        return dict(linha) if linha else None
+
+    def listar(
+        self,
+        status: Optional[str] = None,
+        estado: Optional[str] = None,
+        cidade: Optional[str] = None,
+        origem_edital: Optional[str] = None,
+        provisao_min: Optional[float] = None,
+        provisao_max: Optional[float] = None,
+        apos_id: Optional[int] = None,
+        limite: Optional[int] = None,
+        campos: Optional[Sequence[str]] = None,
+    ) -> List[dict]:
+        condicoes = [
+            ("status = ?", status),
+            ("estado = ?", estado),
+            ("cidade = ?", cidade),
+            ("origem_edital = ?", origem_edital),
+            ("provisao >= ?", provisao_min),
+            ("provisao <= ?", provisao_max),
+            ("id > ?", apos_id),
+        ]
+        condicoes = [(condicao, valor) for condicao, valor in condicoes if valor is not None]
+
+        sql = f"SELECT {', '.join(_campos_retorno(campos))} FROM imoveis"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicao for condicao, _ in condicoes)
+        sql += " ORDER BY id"
+        parametros = [valor for _, valor in condicoes]
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(limite)
+
+        return [dict(linha) for linha in self._conexao().execute(sql, parametros)]
+
+    def buscar(
+        self,
+        texto: Optional[str] = None,
+        status: Optional[str] = None,
+        estado: Optional[str] = None,
+        cidade: Optional[str] = None,
+        provisao_min: Optional[float] = None,
+        provisao_max: Optional[float] = None,
+        apos_id: Optional[int] = None,
+        limite: Optional[int] = None,
+        campos: Optional[Sequence[str]] = None,
+    ) -> ResultadoBusca:
+        condicoes = [
+            ("imoveis.status = ?", status),
+            ("imoveis.estado = ?", estado),
+            ("imoveis.cidade = ?", cidade),
+            ("imoveis.provisao >= ?", provisao_min),
+            ("imoveis.provisao <= ?", provisao_max),
+        ]
+        termos = tokenizar(texto)
+        if termos:
+            # Os termos só têm letras e dígitos; cada um é buscado como prefixo. A busca no
+            # FTS roda uma única vez, como subconsulta, qualquer que seja o plano escolhido
+            # para os outros filtros
+            condicoes.append((
+                "imoveis.id IN (SELECT rowid FROM imoveis_busca WHERE imoveis_busca MATCH ?)",
+                " ".join(f'"{termo}"*' for termo in termos),
+            ))
+        condicoes = [(condicao, valor) for condicao, valor in condicoes if valor is not None]
+
+        where = " AND ".join(condicao for condicao, _ in condicoes) or "1"
+        parametros = [valor for _, valor in condicoes]
+        conexao = self._conexao()
+
+        facetas = Counter({
+            (linha["estado"], linha["cidade"]): linha["quantidade"]
+            for linha in conexao.execute(
+                f"SELECT imoveis.estado, imoveis.cidade, COUNT(*) AS quantidade FROM imoveis "
+                f"WHERE {where} GROUP BY imoveis.estado, imoveis.cidade",
+                parametros,
+            )
+        })
+
+        sql = f"SELECT {', '.join(f'imoveis.{campo}' for campo in _campos_retorno(campos))} FROM imoveis WHERE {where}"
+        if apos_id is not None:
+            sql += " AND imoveis.id > ?"
+            parametros.append(apos_id)
+        sql += " ORDER BY imoveis.id"
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(limite)
+
+        return ResultadoBusca(
+            imoveis=[dict(linha) for linha in conexao.execute(sql, parametros)],
+            total=sum(facetas.values()),
+            facetas_cidade=_facetas_cidade(facetas),
+        )
+
+    def atualizar_status(self, imovel_id: int, status: str) -> Optional[dict]:
+        with self._transacao() as conexao:
+            cursor = conexao.execute("UPDATE imoveis SET status = ? WHERE id = ?", (status, imovel_id))
+            if cursor.rowcount > 0:
+                self._registrar_alteracao(conexao)
+        if cursor.rowcount == 0:
+            return None
+        return self.obter(imovel_id)
+
+    def remover(self, imovel_id: int) -> bool:
+        with self._transacao() as conexao:
+            cursor = conexao.execute("DELETE FROM imoveis WHERE id = ?", (imovel_id,))
+            conexao.execute("DELETE FROM historico_precos WHERE imovel_id = ?", (imovel_id,))
+            conexao.execute("DELETE FROM imoveis_busca WHERE rowid = ?", (imovel_id,))
+            if cursor.rowcount > 0:
+                self._registrar_alteracao(conexao)
+        return cursor.rowcount > 0
+
+
+def criar_armazenamento(destino: str) -> ArmazenamentoImoveis:
+    """
+    Cria o armazenamento a partir do destino configurado: "memoria" para o dicionário
+    em memória ou o caminho do arquivo SQLite.
+    """
+    if destino == "memoria":
+        return ArmazenamentoMemoria()
+    pasta = os.path.dirname(destino)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    return ArmazenamentoSQLite(destino)
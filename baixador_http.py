@@ -0,0 +1,462 @@
+# baixador_http.py
+
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+import metricas
+from metricas import log_detalhado
+from rastreador_downloads import DownloadConcluido
+
+URL_BUSCA = "https://venda-imoveis.caixa.gov.br/sistema/busca-documentos.asp"
+TIPO_DOCUMENTO = "Edital de Publicação do Leilão SFI - Edital Único"
+TEXTO_LINK_EDITAL = "Edital de Publicação do Leilão SFI"
+
+# Conexões HTTP (e downloads simultâneos) por baixador
+MAX_CONEXOES = 4
+# Tentativas de cada download; as seguintes retomam de onde a anterior parou
+MAX_TENTATIVAS = 3
+# Tempo máximo para conectar e entre dois pedaços da resposta, em segundos
+TIMEOUT_HTTP = (10, 60)
+TAMANHO_BLOCO = 256 * 1024
+# Arquivo com a lista de respostas de uma pasta de fixtures
+ARQUIVO_MANIFESTO = "manifesto.json"
+
+_PADRAO_URL_EM_SCRIPT = re.compile(r"""['"]([^'"]+\.pdf(?:\?[^'"]*)?)['"]""", re.IGNORECASE)
+_PADRAO_NOME_ARQUIVO = re.compile(r"""filename\*?=(?:UTF-8'')?"?([^";]+)"?""", re.IGNORECASE)
+
+
+class ErroDownload(Exception):
+    pass
+
+
+# --- Leitura do HTML da busca ---
+
+@dataclass
+class _Formulario:
+    acao: str
+    metodo: str
+    campos: Dict[str, str] = field(default_factory=dict)
+    combos: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)
+
+
+class _LeitorHTML(HTMLParser):
+    """
+    Coleta os formulários (campos ocultos e opções dos combos) e os links da página.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.formularios: List[_Formulario] = []
+        self.links: List[Tuple[str, str, str]] = []  # (href, onclick, texto)
+        self._combo = None
+        self._opcao = None
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {nome: valor or "" for nome, valor in attrs}
+        if tag == "form":
+            self.formularios.append(_Formulario(acao=attrs.get("action", ""), metodo=attrs.get("method", "get").lower()))
+        elif tag == "input" and self.formularios and attrs.get("name"):
+            if attrs.get("type", "text").lower() not in ("button", "submit", "image", "checkbox", "radio"):
+                self.formularios[-1].campos[attrs["name"]] = attrs.get("value", "")
+        elif tag == "select" and self.formularios and attrs.get("name"):
+            self._combo = self.formularios[-1].combos.setdefault(attrs["name"], [])
+        elif tag == "option" and self._combo is not None:
+            self._opcao = [attrs.get("value"), ""]
+        elif tag == "a":
+            self._link = [attrs.get("href", ""), attrs.get("onclick", ""), ""]
+
+    def handle_endtag(self, tag):
+        if tag == "option":
+            self._fechar_opcao()
+        elif tag == "select":
+            self._fechar_opcao()
+            self._combo = None
+        elif tag == "a" and self._link is not None:
+            href, onclick, texto = self._link
+            self.links.append((href, onclick, " ".join(texto.split())))
+            self._link = None
+
+    def handle_data(self, data):
+        if self._opcao is not None:
+            self._opcao[1] += data
+        if self._link is not None:
+            self._link[2] += data
+
+    def _fechar_opcao(self):
+        # O HTML antigo do site às vezes não fecha as tags <option>
+        if self._opcao is not None and self._combo is not None:
+            valor, texto = self._opcao
+            texto = " ".join(texto.split())
+            self._combo.append((texto, texto if valor is None else valor))
+        self._opcao = None
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+
+def _ler_html(html: str) -> _LeitorHTML:
+    leitor = _LeitorHTML()
+    leitor.feed(html)
+    leitor.close()
+    return leitor
+
+
+def extrair_links_editais(html: str, url_base: str) -> List[str]:
+    """
+    Retorna as URLs (absolutas, sem repetição) dos links de edital de uma página de
+    resultados da busca. Links que abrem o PDF por JavaScript são aceitos quando o
+    endereço do PDF aparece no script.
+    """
+    urls = []
+    for href, onclick, texto in _ler_html(html).links:
+        if TEXTO_LINK_EDITAL not in texto:
+            continue
+        if href and not href.lower().startswith(("javascript:", "#")):
+            url = href
+        else:
+            encontrado = _PADRAO_URL_EM_SCRIPT.search(f"{href} {onclick}")
+            if not encontrado:
+                continue
+            url = encontrado.group(1)
+        url = urljoin(url_base, url)
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def _valor_opcao(opcoes: List[Tuple[str, str]], texto: Optional[str] = None, valor: Optional[str] = None) -> Optional[str]:
+    for texto_opcao, valor_opcao in opcoes:
+        if (valor is not None and valor_opcao == valor) or (texto is not None and texto_opcao == texto):
+            return valor_opcao
+    return None
+
+
+def _nome_arquivo(resposta: requests.Response, url: str) -> str:
+    encontrado = _PADRAO_NOME_ARQUIVO.search(resposta.headers.get("Content-Disposition", ""))
+    nome = unquote(encontrado.group(1)) if encontrado else unquote(urlsplit(url).path.rsplit("/", 1)[-1])
+    nome = os.path.basename(nome.strip()) or hashlib.sha1(url.encode()).hexdigest()[:16]
+    return nome if nome.lower().endswith(".pdf") else f"{nome}.pdf"
+
+
+def _tamanho_total(resposta: requests.Response) -> Optional[int]:
+    if resposta.status_code == 206:
+        total = resposta.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+    else:
+        total = resposta.headers.get("Content-Length", "")
+    return int(total) if total.isdigit() else None
+
+
+# --- Fixtures para rodar sem acesso ao site ---
+
+def _chave_requisicao(metodo: str, url: str, corpo) -> Tuple[str, str, str]:
+    if isinstance(corpo, bytes):
+        corpo = corpo.decode("utf-8", errors="replace")
+    return metodo.upper(), url.split("#", 1)[0], corpo or ""
+
+
+class AdaptadorReplay(BaseAdapter):
+    """
+    Responde às requisições com arquivos salvos em uma pasta, sem acessar a rede.
+
+    A pasta tem um `manifesto.json` com uma lista de respostas:
+        [{"metodo": "GET", "url": "https://...", "arquivo": "busca.html",
+          "tipo": "text/html; charset=iso-8859-1"},
+         {"metodo": "POST", "url": "https://...", "corpo": "cmb_estado=SP&...",
+          "arquivo": "resultado.html"},
+         {"metodo": "GET", "url": "https://.../EL0058.pdf", "arquivo": "EL0058.pdf"}]
+
+    Entradas sem "corpo" valem para qualquer corpo. Pedidos com Range são atendidos
+    parcialmente, então a retomada de downloads também pode ser testada. Requisições
+    sem resposta no manifesto recebem 404.
+    """
+
+    def __init__(self, pasta: str):
+        super().__init__()
+        self.pasta = pasta
+        with open(os.path.join(pasta, ARQUIVO_MANIFESTO), encoding="utf-8") as f:
+            self._respostas = json.load(f)
+
+    def _procurar(self, requisicao: requests.PreparedRequest) -> Optional[dict]:
+        metodo, url, corpo = _chave_requisicao(requisicao.method, requisicao.url, requisicao.body)
+        for entrada in self._respostas:
+            if entrada.get("metodo", "GET").upper() != metodo or entrada["url"] != url:
+                continue
+            if "corpo" in entrada and entrada["corpo"] != corpo:
+                continue
+            return entrada
+        return None
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        entrada = self._procurar(request)
+        cabecalhos = CaseInsensitiveDict()
+        if entrada is None:
+            status, conteudo = 404, b""
+        else:
+            with open(os.path.join(self.pasta, entrada["arquivo"]), "rb") as f:
+                conteudo = f.read()
+            status = entrada.get("status", 200)
+            cabecalhos["Content-Type"] = entrada.get("tipo", "application/octet-stream")
+            cabecalhos["ETag"] = f'"{hashlib.sha256(conteudo).hexdigest()[:32]}"'
+            cabecalhos["Accept-Ranges"] = "bytes"
+            faixa = re.match(r"bytes=(\d+)-$", request.headers.get("Range", ""))
+            if faixa and request.headers.get("If-Range", cabecalhos["ETag"]) == cabecalhos["ETag"]:
+                inicio = int(faixa.group(1))
+                if inicio >= len(conteudo):
+                    status, conteudo = 416, b""
+                else:
+                    status = 206
+                    cabecalhos["Content-Range"] = f"bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}"
+                    conteudo = conteudo[inicio:]
+        cabecalhos["Content-Length"] = str(len(conteudo))
+
+        resposta = requests.Response()
+        resposta.status_code = status
+        resposta.reason = requests.status_codes._codes.get(status, ("",))[0].upper()
+        resposta.headers = cabecalhos
+        resposta.raw = io.BytesIO(conteudo)
+        resposta.url = request.url
+        resposta.request = request
+        resposta.encoding = requests.utils.get_encoding_from_headers(cabecalhos)
+        return resposta
+
+    def close(self):
+        pass
+
+
+class AdaptadorGravacao(HTTPAdapter):
+    """
+    Adaptador HTTP normal que salva cada resposta em uma pasta de fixtures, no formato
+    lido pelo AdaptadorReplay. Serve para capturar uma busca real e repeti-la offline.
+    """
+
+    def __init__(self, pasta: str, **kwargs):
+        super().__init__(**kwargs)
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._respostas = []
+
+    def send(self, request, stream=False, **kwargs):
+        # Grava a resposta inteira (sem Range), para que a fixture tenha o arquivo completo
+        request.headers.pop("Range", None)
+        request.headers.pop("If-Range", None)
+        resposta = super().send(request, stream=False, **kwargs)
+        metodo, url, corpo = _chave_requisicao(request.method, request.url, request.body)
+        nome = hashlib.sha1(f"{metodo} {url} {corpo}".encode()).hexdigest()[:16]
+        with open(os.path.join(self.pasta, nome), "wb") as f:
+            f.write(resposta.content)
+
+        entrada = {"metodo": metodo, "url": url, "arquivo": nome, "status": resposta.status_code,
+                   "tipo": resposta.headers.get("Content-Type", "application/octet-stream")}
+        if corpo:
+            entrada["corpo"] = corpo
+        with self._lock:
+            self._respostas.append(entrada)
+            with open(os.path.join(self.pasta, ARQUIVO_MANIFESTO), "w", encoding="utf-8") as f:
+                json.dump(self._respostas, f, ensure_ascii=False, indent=2)
+        return resposta
+
+
+# --- Busca e download ---
+
+class BaixadorHTTP:
+    """
+    Baixa os editais direto por HTTP, sem navegador.
+
+    A busca reproduz o formulário de busca-documentos.asp (lendo os valores dos combos
+    da própria página). Se o formulário não puder ser reproduzido, `buscar_urls_editais`
+    retorna None e quem chamou pode descobrir as URLs com o navegador.
+
+    Os downloads usam uma sessão com conexões reaproveitadas e rodam em paralelo. Cada
+    arquivo é gravado primeiro em um `.part`, retomado com Range se a transferência cair,
+    e só é liberado depois de conferidos o tamanho, a assinatura de PDF e o SHA-256
+    (quando conhecido).
+
+    Com `replay`, as respostas vêm de uma pasta de fixtures (ver AdaptadorReplay); com
+    `gravar_em`, as respostas reais são salvas nesse formato.
+    """
+
+    def __init__(self, max_conexoes: int = MAX_CONEXOES, replay: Optional[str] = None, gravar_em: Optional[str] = None):
+        self.max_conexoes = max_conexoes
+        self.sessao = requests.Session()
+        self.sessao.headers["User-Agent"] = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)"
+        if replay:
+            adaptador = AdaptadorReplay(replay)
+        else:
+            opcoes = {
+                "pool_connections": max_conexoes,
+                "pool_maxsize": max_conexoes,
+                "max_retries": Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+            }
+            adaptador = AdaptadorGravacao(gravar_em, **opcoes) if gravar_em else HTTPAdapter(**opcoes)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fechar()
+
+    def fechar(self):
+        self.sessao.close()
+
+    def importar_cookies(self, cookies: Iterable[dict]):
+        """
+        Copia os cookies de um navegador (driver.get_cookies()) para a sessão, para que
+        os downloads usem a mesma sessão do site em que as URLs foram descobertas.
+        """
+        for cookie in cookies:
+            self.sessao.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+
+    def buscar_urls_editais(self, ano: int, mes_texto: str, estado_sigla: str) -> Optional[List[str]]:
+        """
+        Envia o formulário de busca e retorna as URLs dos editais encontrados (lista
+        vazia se não houver nenhum), ou None se a página não trouxer o formulário com
+        as opções esperadas.
+        """
+        resposta = self.sessao.get(URL_BUSCA, timeout=TIMEOUT_HTTP)
+        resposta.raise_for_status()
+        formulario = next((f for f in _ler_html(resposta.text).formularios if "cmb_tipo_documento" in f.combos), None)
+        if formulario is None:
+            return None
+
+        campos = dict(formulario.campos)
+        selecoes = [
+            ("cmb_tipo_documento", TIPO_DOCUMENTO, None),
+            ("cmb_estado", None, estado_sigla),
+            ("cmb_mes_referencia", mes_texto, None),
+            ("cmb_ano_referencia", str(ano), None),
+        ]
+        for nome_campo, texto, valor in selecoes:
+            # Combos preenchidos por script chegam vazios: não dá para reproduzir a busca
+            valor_opcao = _valor_opcao(formulario.combos.get(nome_campo, []), texto, valor)
+            if valor_opcao is None:
+                return None
+            campos[nome_campo] = valor_opcao
+
+        url_acao = urljoin(resposta.url, formulario.acao or resposta.url)
+        if formulario.metodo == "post":
+            resultado = self.sessao.post(url_acao, data=campos, timeout=TIMEOUT_HTTP)
+        else:
+            resultado = self.sessao.get(url_acao, params=campos, timeout=TIMEOUT_HTTP)
+        resultado.raise_for_status()
+        return extrair_links_editais(resultado.text, resultado.url)
+
+    def baixar(
+        self,
+        urls: Iterable[str],
+        pasta: str,
+        pasta_parciais: Optional[str] = None,
+        sha256_esperados: Optional[Dict[str, str]] = None,
+    ) -> List[DownloadConcluido]:
+        """
+        Baixa as URLs em paralelo para `pasta` e retorna os downloads concluídos. Os
+        arquivos parciais ficam em `pasta_parciais` (por padrão, a própria pasta), para
+        serem retomados numa próxima execução se esta for interrompida.
+        """
+        urls = list(dict.fromkeys(urls))
+        pasta_parciais = pasta_parciais or pasta
+        sha256_esperados = sha256_esperados or {}
+        os.makedirs(pasta, exist_ok=True)
+        os.makedirs(pasta_parciais, exist_ok=True)
+        if not urls:
+            return []
+
+        concluidos = []
+        with ThreadPoolExecutor(max_workers=min(self.max_conexoes, len(urls)), thread_name_prefix="download") as executor:
+            futuros = {
+                executor.submit(self._baixar_arquivo, url, pasta, pasta_parciais, sha256_esperados.get(url)): url
+                for url in urls
+            }
+            for futuro in as_completed(futuros):
+                try:
+                    download = futuro.result()
+                except Exception as e:
+                    print(f"ERRO: Não foi possível baixar {futuros[futuro]}. Erro: {e}")
+                    metricas.incrementar("automacao_falhas_total", etapa="download")
+                    continue
+                log_detalhado(f"  - {download.nome}: {download.tamanho_bytes / 1024:.0f} KB em {download.duracao_segundos:.1f}s")
+                concluidos.append(download)
+        return concluidos
+
+    def _baixar_arquivo(self, url: str, pasta: str, pasta_parciais: str, sha256_esperado: Optional[str]) -> DownloadConcluido:
+        caminho_parcial = os.path.join(pasta_parciais, f"{hashlib.sha1(url.encode()).hexdigest()[:16]}.part")
+        inicio = time.monotonic()
+        for tentativa in range(1, MAX_TENTATIVAS + 1):
+            try:
+                nome, tamanho, sha256 = self._transferir(url, caminho_parcial, sha256_esperado)
+                break
+            except (requests.RequestException, ErroDownload) as e:
+                if tentativa == MAX_TENTATIVAS:
+                    raise
+                print(f"AVISO: Download de {url} falhou na tentativa {tentativa} ({e}). Tentando de novo...")
+
+        os.replace(caminho_parcial, os.path.join(pasta, nome))
+        os.remove(f"{caminho_parcial}.json")
+        return DownloadConcluido(nome=nome, tamanho_bytes=tamanho, duracao_segundos=round(time.monotonic() - inicio, 3), sha256=sha256)
+
+    def _transferir(self, url: str, caminho_parcial: str, sha256_esperado: Optional[str]) -> Tuple[str, int, str]:
+        caminho_info = f"{caminho_parcial}.json"
+        try:
+            with open(caminho_info, encoding="utf-8") as f:
+                info = json.load(f)
+            ja_baixado = os.path.getsize(caminho_parcial)
+        except (OSError, ValueError):
+            info, ja_baixado = {}, 0
+
+        # Sem compressão, para que os bytes (e os Ranges) sejam os do arquivo
+        cabecalhos = {"Accept-Encoding": "identity"}
+        # Só retoma quando há um validador: se o arquivo mudou no servidor, o If-Range
+        # faz a resposta vir inteira em vez de emendar pedaços de versões diferentes
+        if ja_baixado and info.get("validador"):
+            cabecalhos["Range"] = f"bytes={ja_baixado}-"
+            cabecalhos["If-Range"] = info["validador"]
+
+        with self.sessao.get(url, headers=cabecalhos, stream=True, timeout=TIMEOUT_HTTP) as resposta:
+            if resposta.status_code == 416:
+                os.remove(caminho_parcial)
+                raise ErroDownload("faixa pedida inválida; recomeçando do zero")
+            resposta.raise_for_status()
+            retomando = resposta.status_code == 206
+            total = _tamanho_total(resposta)
+            nome = _nome_arquivo(resposta, url)
+            with open(caminho_info, "w", encoding="utf-8") as f:
+                json.dump({"url": url, "validador": resposta.headers.get("ETag") or resposta.headers.get("Last-Modified")}, f)
+
+            hash_sha256 = hashlib.sha256()
+            if retomando:
+                with open(caminho_parcial, "rb") as f:
+                    hashlib.file_digest(f, lambda: hash_sha256)
+            with open(caminho_parcial, "ab" if retomando else "wb") as f:
+                for bloco in resposta.iter_content(TAMANHO_BLOCO):
+                    f.write(bloco)
+                    hash_sha256.update(bloco)
+
+        tamanho = os.path.getsize(caminho_parcial)
+        if total is not None and tamanho != total:
+            # O .part fica: a próxima tentativa continua de onde parou
+            raise ErroDownload(f"transferência incompleta ({tamanho} de {total} bytes)")
+        with open(caminho_parcial, "rb") as f:
+            assinatura = f.read(5)
+        sha256 = hash_sha256.hexdigest()
+        if assinatura != b"%PDF-" or (sha256_esperado and sha256 != sha256_esperado):
+            os.remove(caminho_parcial)
+            raise ErroDownload("o arquivo recebido não é o PDF esperado (assinatura ou SHA-256 não confere)")
+        return nome, tamanho, sha256
@@ -0,0 +1,367 @@
+# benchmark_pipeline.py
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from importlib import metadata
+from typing import Callable, Dict, List, Optional
+
+import pypdfium2 as pdfium
+
+import armazenamento
+from filtro_imoveis import LotesColunares, RegrasFiltro
+from processador_pdf import (
+    PADRAO_LINHA_LOTE,
+    _iterar_faixas_pdf,
+    detectar_paginas_imoveis,
+    extrair_imoveis_do_texto,
+    filtrar_imoveis,
+    limpar_valor_monetario,
+)
+
+# Editais de amostra que acompanham o repositório
+PASTA_EDITAIS = "editais_baixados"
+EDITAIS_AMOSTRA = ("EL00580225CPARE.pdf", "EL00590225CPARE.pdf", "EL00600225CPARE.pdf")
+# Quantidade de lotes de cada edital sintético medido
+TAMANHOS_PADRAO = (1000, 5000, 20000)
+# Maior edital sintético cujo PDF também passa pelo pdfplumber (cerca de 0,25 s por página)
+MAX_LOTES_EXTRACAO = 2000
+# Cada etapa é repetida e o resultado guarda o menor tempo e a mediana
+REPETICOES = 3
+# Aumento de tempo, em relação à execução anterior, considerado regressão
+TOLERANCIA_REGRESSAO = 0.20
+ARQUIVO_RESULTADO = "benchmark_resultado.json"
+# Regras usadas para medir uma nova filtragem dos lotes já carregados em colunas
+REGRAS_REFILTRO = RegrasFiltro(
+    provisao_minima=10000,
+    desconto_minimo_pct=30,
+    provisao_minima_por_estado={"SP": 20000},
+    provisao_minima_por_cidade={"PA/BELEM": 15000},
+)
+# Versão do formato do JSON gerado; mude se a estrutura deixar de ser comparável
+VERSAO_FORMATO = 1
+
+
+def _medir(funcao: Callable, repeticoes: int, preparar: Optional[Callable] = None):
+    """
+    Executa `funcao` `repeticoes` vezes e retorna os tempos (em segundos) e o resultado
+    da última execução. `preparar`, se informado, roda antes de cada repetição, fora da
+    medição, e seu retorno é passado para `funcao`.
+    """
+    tempos, resultado = [], None
+    for _ in range(repeticoes):
+        argumentos = (preparar(),) if preparar else ()
+        inicio = time.perf_counter()
+        resultado = funcao(*argumentos)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, resultado
+
+
+def _resumo(tempos: List[float], itens: int) -> dict:
+    melhor = min(tempos)
+    return {
+        "segundos_min": round(melhor, 6),
+        "segundos_mediana": round(statistics.median(tempos), 6),
+        "repeticoes": len(tempos),
+        "itens": itens,
+        "itens_por_segundo": round(itens / melhor, 1) if melhor > 0 else None,
+    }
+
+
+def _ambiente() -> dict:
+    pacotes = {}
+    for pacote in ("pdfplumber", "pypdfium2", "fastapi", "pydantic", "starlette"):
+        try:
+            pacotes[pacote] = metadata.version(pacote)
+        except metadata.PackageNotFoundError:
+            pacotes[pacote] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "pacotes": pacotes,
+    }
+
+
+def medir_editais_amostra(pasta: str, nomes=EDITAIS_AMOSTRA) -> tuple[List[dict], List[dict]]:
+    """
+    Mede a pré-varredura (pdfium) e a extração de texto (pdfplumber) de cada edital de
+    amostra. Retorna as medições e as páginas com imóveis extraídas, na ordem dos
+    editais, cada uma com o texto e a quantidade de lotes que começam nela.
+    """
+    medicoes, paginas = [], []
+    for nome in nomes:
+        caminho = os.path.join(pasta, nome)
+        print(f"  - Extraindo {nome}...")
+        tempos_varredura, faixas = _medir(lambda: detectar_paginas_imoveis(caminho), 1)
+        tempos_extracao, textos = _medir(lambda: list(_iterar_faixas_pdf(caminho, faixas)), 1)
+        indices = [indice for inicio, fim in faixas for indice in range(inicio, fim)]
+        lotes_edital = 0
+        for indice, texto in zip(indices, textos):
+            lotes = sum(1 for linha in texto.splitlines() if PADRAO_LINHA_LOTE.match(linha))
+            lotes_edital += lotes
+            paginas.append({"edital": nome, "indice": indice, "texto": texto, "lotes": lotes})
+        medicoes.append({
+            "edital": nome,
+            "paginas": len(textos),
+            "lotes": lotes_edital,
+            "varredura_pdfium": _resumo(tempos_varredura, len(indices)),
+            "extracao_pdfplumber": _resumo(tempos_extracao, len(textos)),
+        })
+    return medicoes, paginas
+
+
+def montar_paginas_sinteticas(paginas_amostra: List[dict], lotes: int) -> List[dict]:
+    """
+    Monta um edital sintético com pelo menos `lotes` lotes repetindo, em ciclo, as
+    páginas com imóveis dos editais de amostra. Cada ciclo começa na primeira página
+    de um edital, que traz o cabeçalho de estado e cidade, então o parser lê todas as
+    cópias como lotes válidos.
+    """
+    if not any(pagina["lotes"] for pagina in paginas_amostra):
+        raise ValueError("Os editais de amostra não têm lotes para montar o edital sintético.")
+    paginas, total = [], 0
+    while total < lotes:
+        for pagina in paginas_amostra:
+            paginas.append(pagina)
+            total += pagina["lotes"]
+            if total >= lotes:
+                break
+    return paginas
+
+
+def gravar_pdf_sintetico(paginas: List[dict], pasta_amostra: str, destino: str):
+    """
+    Grava o PDF do edital sintético, copiando as páginas originais dos editais de amostra.
+    """
+    originais = {}
+    pdf = pdfium.PdfDocument.new()
+    try:
+        for pagina in paginas:
+            if pagina["edital"] not in originais:
+                originais[pagina["edital"]] = pdfium.PdfDocument(os.path.join(pasta_amostra, pagina["edital"]))
+            pdf.import_pages(originais[pagina["edital"]], [pagina["indice"]])
+        pdf.save(destino)
+    finally:
+        pdf.close()
+        for original in originais.values():
+            original.close()
+
+
+def medir_extracao_sintetica(paginas: List[dict], pasta_amostra: str, pasta_temporaria: str) -> dict:
+    caminho = os.path.join(pasta_temporaria, "edital_sintetico.pdf")
+    gravar_pdf_sintetico(paginas, pasta_amostra, caminho)
+    tempos_varredura, faixas = _medir(lambda: detectar_paginas_imoveis(caminho), 1)
+    tempos_extracao, textos = _medir(lambda: list(_iterar_faixas_pdf(caminho, faixas)), 1)
+    return {
+        "varredura_pdfium": _resumo(tempos_varredura, len(paginas)),
+        "extracao_pdfplumber": _resumo(tempos_extracao, len(textos)),
+    }
+
+
+def medir_api(api, imoveis: List[dict], pasta_temporaria: str, repeticoes: int) -> Dict[str, dict]:
+    """
+    Mede a gravação dos imóveis aprovados pela API (validação e inserção em um banco
+    SQLite novo a cada repetição), a nova gravação dos mesmos imóveis (todos já
+    existentes, sem mudanças) e a listagem em GET /imoveis/: a lista inteira, a
+    paginação por cursor e a exportação em NDJSON. As listagens são medidas com o cache
+    de respostas vazio; a lista inteira é medida também já guardada no cache.
+    """
+    from fastapi.testclient import TestClient
+
+    # As cópias das páginas repetem os mesmos lotes; com uma matrícula própria, cada
+    # lote do edital sintético é um imóvel diferente para a deduplicação
+    imoveis = [dict(imovel, matricula=f"{imovel['matricula'] or 'SEM'}-{i}") for i, imovel in enumerate(imoveis)]
+
+    bancos = iter(range(repeticoes))
+
+    def novo_banco():
+        caminho = os.path.join(pasta_temporaria, f"imoveis_{next(bancos)}.db")
+        api.db_imoveis = armazenamento.ArmazenamentoSQLite(caminho)
+
+    tempos_ingestao, _ = _medir(lambda _: api.salvar_imoveis(imoveis), repeticoes, preparar=novo_banco)
+    tempos_reingestao, gravacao = _medir(lambda: api.salvar_imoveis(imoveis), repeticoes)
+    if gravacao.novos or gravacao.atualizados:
+        raise RuntimeError("A nova gravação dos mesmos imóveis alterou o banco.")
+
+    cliente = TestClient(api.app)
+
+    def listar(**parametros):
+        resposta = cliente.get("/imoveis/", params=parametros)
+        resposta.raise_for_status()
+        return resposta
+
+    def paginar():
+        cursor, total = None, 0
+        while True:
+            resposta = listar(limite=api.LIMITE_MAXIMO_PAGINA, **({"cursor": cursor} if cursor else {}))
+            total += len(resposta.json())
+            cursor = resposta.headers.get("X-Proximo-Cursor")
+            if not cursor:
+                return total
+
+    limpar_cache = api.cache_listagens.limpar
+    tempos_lista, resposta = _medir(lambda _: listar().json(), repeticoes, preparar=limpar_cache)
+    tempos_lista_cache, _ = _medir(lambda: listar().json(), repeticoes)
+    tempos_paginas, total_paginado = _medir(lambda _: paginar(), repeticoes, preparar=limpar_cache)
+    tempos_ndjson, linhas = _medir(lambda: listar(formato="ndjson").text.count("\n"), repeticoes)
+    if not len(resposta) == total_paginado == linhas == len(imoveis):
+        raise RuntimeError("A listagem da API não devolveu todos os imóveis gravados.")
+
+    return {
+        "ingestao_api": _resumo(tempos_ingestao, len(imoveis)),
+        "reingestao_api": _resumo(tempos_reingestao, len(imoveis)),
+        "listagem_api": _resumo(tempos_lista, len(resposta)),
+        "listagem_api_cache": _resumo(tempos_lista_cache, len(resposta)),
+        "listagem_api_paginada": _resumo(tempos_paginas, total_paginado),
+        "listagem_api_ndjson": _resumo(tempos_ndjson, linhas),
+    }
+
+
+def medir_tamanho(
+    api, paginas_amostra: List[dict], lotes: int, pasta_amostra: str, repeticoes: int, max_lotes_extracao: int
+) -> dict:
+    print(f"  - Edital sintético com {lotes} lotes...")
+    paginas = montar_paginas_sinteticas(paginas_amostra, lotes)
+    texto = "\n".join(pagina["texto"] for pagina in paginas)
+    nome = f"SINTETICO_{lotes}.pdf"
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as pasta_temporaria:
+        etapas = {}
+        if lotes <= max_lotes_extracao:
+            etapas.update(medir_extracao_sintetica(paginas, pasta_amostra, pasta_temporaria))
+
+        tempos, brutos = _medir(lambda: extrair_imoveis_do_texto(texto, nome), repeticoes)
+        etapas["parser"] = _resumo(tempos, len(brutos))
+
+        valores = [imovel[campo] for imovel in brutos for campo in ("valor1_str", "valor2_str")]
+        tempos, _ = _medir(lambda: [limpar_valor_monetario(valor) for valor in valores], repeticoes)
+        etapas["limpar_valor_monetario"] = _resumo(tempos, len(valores))
+
+        tempos, aprovados = _medir(lambda: filtrar_imoveis(brutos), repeticoes)
+        etapas["filtro"] = _resumo(tempos, len(brutos))
+
+        tempos, lotes_colunares = _medir(lambda: LotesColunares(brutos), repeticoes)
+        etapas["lotes_colunares"] = _resumo(tempos, len(brutos))
+        tempos, _ = _medir(lambda: lotes_colunares.aprovados(REGRAS_REFILTRO), repeticoes)
+        etapas["refiltro_colunar"] = _resumo(tempos, len(brutos))
+
+        etapas.update(medir_api(api, aprovados, pasta_temporaria, repeticoes))
+
+    for etapa, resumo in etapas.items():
+        print(f"    {etapa}: {resumo['segundos_min']:.4f}s ({resumo['itens']} itens)")
+    return {
+        "lotes_pedidos": lotes,
+        "paginas": len(paginas),
+        "lotes_extraidos": len(brutos),
+        "lotes_aprovados": len(aprovados),
+        "etapas": etapas,
+    }
+
+
+def executar_benchmark(
+    pasta: str = PASTA_EDITAIS,
+    tamanhos=TAMANHOS_PADRAO,
+    repeticoes: int = REPETICOES,
+    max_lotes_extracao: int = MAX_LOTES_EXTRACAO,
+) -> dict:
+    """
+    Executa o benchmark completo e retorna o resultado no formato gravado em JSON.
+    """
+    # A API é importada com o banco em memória; cada medição troca o banco por um novo
+    os.environ["IMOVEIS_DB"] = "memoria"
+    import main as api
+
+    print(">>> Medindo os editais de amostra...")
+    editais, paginas_amostra = medir_editais_amostra(pasta)
+    print(">>> Medindo os editais sintéticos...")
+    resultados_tamanhos = [
+        medir_tamanho(api, paginas_amostra, lotes, pasta, repeticoes, max_lotes_extracao) for lotes in tamanhos
+    ]
+    return {
+        "versao_formato": VERSAO_FORMATO,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": _ambiente(),
+        "parametros": {
+            "tamanhos": list(tamanhos),
+            "repeticoes": repeticoes,
+            "max_lotes_extracao": max_lotes_extracao,
+        },
+        "editais": editais,
+        "tamanhos": resultados_tamanhos,
+    }
+
+
+def _tempos_por_chave(resultado: dict) -> Dict[str, float]:
+    tempos = {}
+    for edital in resultado.get("editais", []):
+        for etapa in ("varredura_pdfium", "extracao_pdfplumber"):
+            tempos[f"editais/{edital['edital']}/{etapa}"] = edital[etapa]["segundos_min"]
+    for tamanho in resultado.get("tamanhos", []):
+        for etapa, resumo in tamanho["etapas"].items():
+            tempos[f"tamanhos/{tamanho['lotes_pedidos']}/{etapa}"] = resumo["segundos_min"]
+    return tempos
+
+
+def comparar_resultados(atual: dict, anterior: dict, tolerancia: float = TOLERANCIA_REGRESSAO) -> List[dict]:
+    """
+    Compara o menor tempo de cada etapa com o de uma execução anterior e retorna as
+    etapas que ficaram mais de `tolerancia` (fração) mais lentas. Etapas presentes em
+    só uma das execuções são ignoradas.
+    """
+    if anterior.get("versao_formato") != atual.get("versao_formato"):
+        raise ValueError("Os resultados foram gravados em versões diferentes do formato.")
+    tempos_atuais, tempos_anteriores = _tempos_por_chave(atual), _tempos_por_chave(anterior)
+    regressoes = []
+    for chave, antes in tempos_anteriores.items():
+        depois = tempos_atuais.get(chave)
+        if depois is None or antes <= 0:
+            continue
+        variacao = depois / antes - 1
+        if variacao > tolerancia:
+            regressoes.append({"etapa": chave, "antes": antes, "depois": depois, "variacao": round(variacao, 3)})
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede cada etapa da leitura dos editais até a listagem da API.")
+    parser.add_argument("--pasta", default=PASTA_EDITAIS, help="pasta com os editais de amostra")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO), help="lotes de cada edital sintético")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--max-lotes-extracao", type=int, default=MAX_LOTES_EXTRACAO,
+                        help="maior edital sintético que também passa pelo pdfplumber")
+    parser.add_argument("--saida", default=ARQUIVO_RESULTADO, help="arquivo JSON do resultado")
+    parser.add_argument("--comparar", help="resultado JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO)
+    argumentos = parser.parse_args()
+
+    resultado = executar_benchmark(
+        argumentos.pasta, argumentos.tamanhos, argumentos.repeticoes, argumentos.max_lotes_extracao
+    )
+    with open(argumentos.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultado gravado em {argumentos.saida}")
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding="utf-8") as f:
+            regressoes = comparar_resultados(resultado, json.load(f), argumentos.tolerancia)
+        for regressao in regressoes:
+            print(f"  REGRESSÃO {regressao['etapa']}: {regressao['antes']:.4f}s -> {regressao['depois']:.4f}s "
+                  f"(+{regressao['variacao']:.0%})")
+        if regressoes:
+            sys.exit(1)
+        print("Nenhuma regressão encontrada.")
@@ -0,0 +1,112 @@
+# cache_extracao.py
+
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from typing import Iterable, Iterator
+
+# Pasta (dentro da pasta dos editais) onde ficam as entradas do cache
+PASTA_CACHE = ".cache_extracao"
+
+
+def _caminho_temporario(caminho: str) -> str:
+    # Nome único por gravação: jobs simultâneos (mesmo no mesmo processo) podem gravar a
+    # mesma entrada ao mesmo tempo, e cada um precisa do seu arquivo temporário
+    return f"{caminho}.{uuid.uuid4().hex}.tmp"
+
+
+def _remover_se_existir(caminho: str):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def calcular_hash_arquivo(caminho: str) -> str:
+    """
+    Calcula o SHA-256 do conteúdo do arquivo. O cache é indexado por esse hash,
+    então um mesmo edital salvo com outro nome continua sendo reaproveitado.
+    """
+    with open(caminho, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class CacheExtracao:
+    """
+    Cache persistente do trabalho feito sobre cada PDF, endereçado pelo hash do conteúdo.
+
+    Cada entrada é um dicionário salvo em `<pasta>/<sha256>.json.gz`. Quem usa o cache
+    decide o que guardar nela (imóveis extraídos, versões das regras); aqui só se garante
+    a leitura tolerante a falhas e a escrita atômica. O texto das páginas fica à parte,
+    em `<pasta>/<sha256>.paginas.jsonl.gz`, uma página por linha, para poder ser gravado
+    e relido sem carregar o PDF inteiro em memória.
+    """
+
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def _caminho_entrada(self, sha256: str) -> str:
+        return os.path.join(self.pasta, f"{sha256}.json.gz")
+
+    def _caminho_paginas(self, sha256: str) -> str:
+        return os.path.join(self.pasta, f"{sha256}.paginas.jsonl.gz")
+
+    def obter(self, caminho_pdf: str) -> dict:
+        """
+        Retorna a entrada do PDF informado. Se não houver nada salvo (ou a entrada
+        estiver corrompida), retorna uma entrada nova contendo apenas o hash.
+        """
+        sha256 = calcular_hash_arquivo(caminho_pdf)
+        try:
+            with gzip.open(self._caminho_entrada(sha256), "rt", encoding="utf-8") as f:
+                entrada = json.load(f)
+        except (OSError, ValueError):
+            return {"sha256": sha256}
+
+        entrada["sha256"] = sha256
+        return entrada
+
+    def salvar(self, entrada: dict):
+        caminho = self._caminho_entrada(entrada["sha256"])
+        caminho_temporario = _caminho_temporario(caminho)
+        try:
+            with gzip.open(caminho_temporario, "wt", encoding="utf-8") as f:
+                json.dump(entrada, f, ensure_ascii=False)
+            os.replace(caminho_temporario, caminho)
+        except BaseException:
+            _remover_se_existir(caminho_temporario)
+            raise
+
+    def gravar_paginas(self, sha256: str, paginas: Iterable[str]) -> Iterator[str]:
+        """
+        Repassa adiante o texto de cada página enquanto o grava no cache. O arquivo só
+        passa a valer quando todas as páginas foram consumidas; se a leitura for
+        interrompida por um erro, nada é gravado.
+        """
+        caminho = self._caminho_paginas(sha256)
+        caminho_temporario = _caminho_temporario(caminho)
+        try:
+            with gzip.open(caminho_temporario, "wt", encoding="utf-8") as f:
+                for texto_pagina in paginas:
+                    f.write(json.dumps(texto_pagina, ensure_ascii=False) + "\n")
+                    yield texto_pagina
+            os.replace(caminho_temporario, caminho)
+        except BaseException:
+            _remover_se_existir(caminho_temporario)
+            raise
+
+    def ler_paginas(self, sha256: str) -> Iterator[str]:
+        with gzip.open(self._caminho_paginas(sha256), "rt", encoding="utf-8") as f:
+            for linha in f:
+                yield json.loads(linha)
+
+    def limpar(self):
+        """
+        Remove todas as entradas do cache.
+        """
+        for nome_arquivo in os.listdir(self.pasta):
+            if nome_arquivo.endswith(".gz"):
+                os.remove(os.path.join(self.pasta, nome_arquivo))
@@ -0,0 +1,110 @@
+# cache_respostas.py
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Corpos menores que isso são enviados sem compressão (o gzip não compensa)
+TAMANHO_MINIMO_GZIP = 1024
+NIVEL_GZIP = 5
+
+
+def serializar_json(dados) -> bytes:
+    """
+    Serializa os registros já validados com o orjson, bem mais rápido que o json da
+    biblioteca padrão para listas grandes de dicionários.
+    """
+    return orjson.dumps(dados)
+
+
+class RespostaSerializada:
+    """
+    Corpo JSON de uma resposta, com o ETag e os cabeçalhos próprios dela (ex: o cursor
+    da próxima página). A versão comprimida com gzip é gerada na primeira vez em que
+    um cliente a aceita, e guardada junto.
+    """
+
+    def __init__(self, corpo: bytes, headers: Dict[str, str]):
+        self.corpo = corpo
+        self.headers = headers
+        self.etag = f'"{hashlib.blake2b(corpo, digest_size=12).hexdigest()}"'
+        self._corpo_gzip: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tamanho(self) -> int:
+        return len(self.corpo) + len(self._corpo_gzip or b"")
+
+    def corpo_gzip(self) -> bytes:
+        with self._lock:
+            if self._corpo_gzip is None:
+                self._corpo_gzip = gzip.compress(self.corpo, compresslevel=NIVEL_GZIP, mtime=0)
+            return self._corpo_gzip
+
+    def responder(self, request: Request) -> Response:
+        """
+        Monta a resposta para a requisição: 304 se o cliente já tem este corpo
+        (If-None-Match), gzip se ele aceitar e o corpo for grande o bastante.
+        """
+        headers = {**self.headers, "ETag": self.etag, "Vary": "Accept-Encoding"}
+        etags_cliente = {etag.strip() for etag in request.headers.get("if-none-match", "").split(",")}
+        if self.etag in etags_cliente or "*" in etags_cliente:
+            return Response(status_code=304, headers=headers)
+        if len(self.corpo) >= TAMANHO_MINIMO_GZIP and "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.corpo_gzip(), media_type="application/json", headers=headers)
+        return Response(self.corpo, media_type="application/json", headers=headers)
+
+
+class CacheRespostas:
+    """
+    Guarda as respostas JSON das listagens já serializadas, pela URL da requisição e
+    pela versão do armazenamento (ver ArmazenamentoImoveis.versao). Qualquer gravação
+    muda a versão, então uma resposta guardada nunca é servida depois de os imóveis
+    mudarem. As menos usadas são descartadas quando o total passa de `max_bytes`;
+    com `max_bytes=0` nada é guardado, mas as respostas continuam com ETag e gzip.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._respostas: "OrderedDict[str, Tuple[int, RespostaSerializada]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(
+        self, chave: str, versao: int, gerar: Callable[[], Tuple[object, Dict[str, str]]]
+    ) -> RespostaSerializada:
+        """
+        Retorna a resposta guardada para a chave na versão informada ou, se não houver,
+        chama `gerar` (que retorna os dados e os cabeçalhos), serializa e guarda.
+        """
+        with self._lock:
+            guardada = self._respostas.get(chave)
+            if guardada is not None and guardada[0] == versao:
+                self._respostas.move_to_end(chave)
+                return guardada[1]
+
+        dados, headers = gerar()
+        resposta = RespostaSerializada(serializar_json(dados), headers)
+        if self.max_bytes > 0 and len(resposta.corpo) <= self.max_bytes:
+            with self._lock:
+                self._respostas[chave] = (versao, resposta)
+                self._respostas.move_to_end(chave)
+                self._descartar_excedente()
+        return resposta
+
+    def _descartar_excedente(self):
+        # O tamanho do gzip entra na conta quando ele já foi gerado
+        total = sum(resposta.tamanho for _, resposta in self._respostas.values())
+        while total > self.max_bytes and self._respostas:
+            _, (_, resposta) = self._respostas.popitem(last=False)
+            total -= resposta.tamanho
+
+    def limpar(self):
+        with self._lock:
+            self._respostas.clear()
@@ -1,8 +1,13 @@
 # executar_automacao.py (VERSÃO FINAL)
 
-from datetime import date, datetime
+from datetime import date
 import scraper_caixa
+import filtro_imoveis
+import metricas
+import planejador_backfill
 import processador_pdf
+from baixador_http import BaixadorHTTP
+from contextlib import nullcontext
 from pprint import pprint
 import os # Importamos o módulo 'os'
 
@@ -10,28 +15,24 @@ import os # Importamos o módulo 'os'
 # ---               PAINEL DE CONTROLE DA AUTOMAÇÃO               ---
 # ===================================================================
 DATA_INICIO_BUSCA = date.today()
+DATA_FIM_BUSCA = None # Último mês buscado (None = mês atual)
 ESTADOS_PARA_BUSCAR = ["SP"] # Adicione os estados que desejar
 PASTA_DOWNLOADS = "editais_baixados"
+WORKERS_EXTRACAO = os.cpu_count() or 1 # Processos usados para ler os PDFs
+MAX_NAVEGADORES = 2 # Buscas feitas ao mesmo tempo (um Chrome headless reaproveitado para cada)
+MODO_DOWNLOAD = "navegador" # "navegador" (cliques no Chrome) ou "http" (download direto dos PDFs)
+MODO_EXTRACAO = processador_pdf.MODO_TEXTO # MODO_TEXTO (texto de cada página) ou MODO_GEOMETRIA (colunas da tabela)
+ARQUIVO_REGRAS_FILTRO = None # JSON com as regras de aprovação (None = provisão mínima de R$ 5.000,00)
+LOG_DETALHADO = True # False mostra só resumos, avisos e erros (sem o progresso de cada arquivo)
 # ===================================================================
 
-def gerar_meses_anos(data_inicio):
-    meses = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", 
-             "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
-    data_atual = datetime.now()
-    ano_atual, mes_atual = data_atual.year, data_atual.month
-    ano, mes = data_inicio.year, data_inicio.month
-    
-    while ano < ano_atual or (ano == ano_atual and mes <= mes_atual):
-        yield (ano, meses[mes-1])
-        mes += 1
-        if mes > 12:
-            mes = 1
-            ano += 1
-
 if __name__ == "__main__":
+    metricas.LOG_DETALHADO = LOG_DETALHADO
     print("="*50)
     print(f"INICIANDO BUSCA AUTOMÁTICA POR EDITAIS")
     print(f"Data de início da busca: {DATA_INICIO_BUSCA.strftime('%d/%m/%Y')}")
+    if DATA_FIM_BUSCA:
+        print(f"Data de fim da busca: {DATA_FIM_BUSCA.strftime('%d/%m/%Y')}")
     print("="*50)
     
     # Lista de arquivos para verificar se já foram processados
@@ -41,27 +42,34 @@ if __name__ == "__main__":
         with open(arquivos_ja_processados_path, "r") as f:
             arquivos_ja_processados = set(f.read().splitlines())
 
-    # Etapa 1: O Gerente manda o Coletor buscar os arquivos mês a mês
-    for estado in ESTADOS_PARA_BUSCAR:
-        for ano, mes in gerar_meses_anos(DATA_INICIO_BUSCA):
-            scraper_caixa.baixar_editais_por_mes(
-                ano=ano,
-                mes_texto=mes,
-                estado_sigla=estado,
-                pasta_download=PASTA_DOWNLOADS,
-                arquivos_existentes=list(arquivos_ja_processados) # Passa os arquivos já processados para o scraper
-            )
+    # Etapa 1: O Gerente monta o plano (mês a mês, estado a estado), retomando os checkpoints
+    checkpoints = planejador_backfill.CheckpointsBackfill(PASTA_DOWNLOADS)
+    plano = planejador_backfill.planejar_backfill(checkpoints, ESTADOS_PARA_BUSCAR, DATA_INICIO_BUSCA, DATA_FIM_BUSCA)
+    print(f"Plano: {plano.resumo()}")
 
-    # Etapa 2: O Gerente manda o Analista processar o que foi coletado
-    imoveis_novos_encontrados = processador_pdf.processar_pdfs_e_filtrar(PASTA_DOWNLOADS, arquivos_ja_processados)
-    
-    # Salva os novos arquivos processados
-    if imoveis_novos_encontrados:
-      # Obtém o nome do arquivo de origem de cada imóvel e o armazena no conjunto
-      novos_arquivos_processados = {imovel["origem_edital"] for imovel in imoveis_novos_encontrados}
-      with open(arquivos_ja_processados_path, "a") as f:
-        for arquivo in novos_arquivos_processados:
-          f.write(f"{arquivo}\n")
+    def registrar_processados(unidade, imoveis):
+        # Salva os novos arquivos processados a cada mês, para não se perderem se a execução parar
+        novos_arquivos_processados = {imovel["origem_edital"] for imovel in imoveis}
+        arquivos_ja_processados.update(novos_arquivos_processados)
+        with open(arquivos_ja_processados_path, "a") as f:
+            for arquivo in novos_arquivos_processados:
+                f.write(f"{arquivo}\n")
+
+    # Etapa 2: O Coletor baixa os meses em paralelo e o Analista processa cada um assim que chega
+    baixador = BaixadorHTTP() if MODO_DOWNLOAD == "http" else None
+    with scraper_caixa.PoolNavegadores(tamanho=MAX_NAVEGADORES) as pool, (baixador or nullcontext()):
+        imoveis_novos_encontrados = planejador_backfill.executar_backfill(
+            plano,
+            checkpoints,
+            pool=pool,
+            baixador=baixador,
+            max_downloads=MAX_NAVEGADORES,
+            workers=WORKERS_EXTRACAO,
+            regras=filtro_imoveis.carregar_regras(ARQUIVO_REGRAS_FILTRO),
+            arquivos_ja_processados=arquivos_ja_processados,
+            ao_processar=registrar_processados,
+            modo_extracao=MODO_EXTRACAO,
+        )
 
     if imoveis_novos_encontrados:
         print("\n--- NOVOS IMÓVEIS APROVADOS ENCONTRADOS NESTA BUSCA ---")
@@ -0,0 +1,445 @@
+# extracao_geometria.py
+
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pdfplumber
+import pypdfium2 as pdfium
+
+from processador_pdf import (
+    PADRAO_CIDADE,
+    PADRAO_ESTADO,
+    PADRAO_MATRICULA,
+    _iterar_faixas_pdf,
+    detectar_paginas_imoveis,
+    iterar_imoveis_das_paginas,
+    limpar_valor_monetario,
+)
+
+# Distância vertical máxima (em pontos) entre trechos de texto de uma mesma linha da tabela
+TOLERANCIA_LINHA = 3.0
+# Espaço horizontal máximo entre dois caracteres (ou palavras) de uma mesma célula
+ESPACO_MAXIMO_PALAVRAS = 5.0
+# Folga à esquerda da primeira coluna com título, onde fica o número do lote
+FOLGA_COLUNA_ITEM = 5.0
+# Distância máxima entre o início de um trecho e o início da célula da linha do lote
+# para considerá-lo parte da mesma coluna
+TOLERANCIA_ALINHAMENTO = 4.0
+
+# Títulos das colunas da tabela de imóveis (comparados em minúsculas, sem o resto do texto)
+TITULOS_COLUNAS = (
+    ("emp", "empreendimento"),  # algumas tabelas abreviam para "EMP"
+    ("endere", "endereco"),
+    ("bairro", "bairro"),
+    ("descri", "descricao"),
+    ("número", "numero_bem"),
+    ("numero", "numero_bem"),
+    ("valor", "valor"),
+)
+COLUNAS_VALORES = ("valor_1_leilao", "valor_2_leilao", "valor_avaliacao")
+# Linhas que só repetem o restante do título (ex: "Venda", "1º Leilão", "(R$)")
+PADRAO_RESTO_CABECALHO = re.compile(r"^(valor de|venda|[12]º leil[aã]o|\(r\$\)|bem|avalia[çc][aã]o)$", re.IGNORECASE)
+PADRAO_VALOR_CELULA = re.compile(r"^\d[\d.]*,\d{2}$")
+# Textos que marcam o cabeçalho e o rodapé de cada página (fora da tabela)
+PADRAO_FIM_CABECALHO_PAGINA = re.compile(r"9\.514/97")
+PADRAO_INICIO_RODAPE_PAGINA = re.compile(r"^Alô CAIXA", re.IGNORECASE)
+
+
+@dataclass
+class LoteEdital:
+    """
+    Lote lido da tabela do edital, com cada coluna no seu campo e os valores já convertidos.
+    """
+    id_lote: int
+    estado: str
+    cidade: str
+    empreendimento: str
+    endereco: str
+    bairro: str
+    descricao: str
+    numero_bem: str
+    matricula: Optional[str]
+    valor_1_leilao: float
+    valor_2_leilao: float
+    valor_avaliacao: float
+    origem_edital: str
+    pagina: int
+
+    def como_imovel_bruto(self) -> dict:
+        """
+        O lote no formato gerado por processador_pdf.iterar_imoveis_das_paginas, para
+        passar pelo mesmo filtro e pelo mesmo cache dos lotes lidos do texto.
+        """
+        return {
+            "id_lote": self.id_lote,
+            "estado": self.estado,
+            "cidade": self.cidade,
+            "endereco": self.endereco,
+            "matricula": self.matricula,
+            "valor1_str": _formatar_valor_brl(self.valor_1_leilao),
+            "valor2_str": _formatar_valor_brl(self.valor_2_leilao),
+            "origem_edital": self.origem_edital,
+        }
+
+
+def _formatar_valor_brl(valor: float) -> str:
+    # 1234.5 -> "1.234,50", o formato lido por limpar_valor_monetario
+    return f"{valor:,.2f}".translate(str.maketrans(",.", ".,"))
+
+
+@dataclass
+class _Segmento:
+    x0: float
+    x1: float
+    topo: float
+    texto: str
+
+    @property
+    def centro(self) -> float:
+        return (self.x0 + self.x1) / 2
+
+
+@dataclass
+class _Colunas:
+    """
+    Limites das colunas de uma tabela, calculados a partir dos títulos: os títulos são
+    centralizados nas colunas, então o limite entre duas colunas fica no meio dos centros
+    dos dois títulos, e cada trecho de texto vai para a coluna do seu centro.
+    """
+    inicio_primeira: float
+    nomes: List[str]
+    limites: List[float]
+
+    @classmethod
+    def do_cabecalho(cls, linha: List[_Segmento]) -> Optional["_Colunas"]:
+        titulos = []
+        for segmento in linha:
+            texto = segmento.texto.strip().lower()
+            nome = next((nome for prefixo, nome in TITULOS_COLUNAS if texto.startswith(prefixo)), None)
+            if nome:
+                titulos.append((segmento, nome))
+        nomes = [nome for _, nome in titulos]
+        if "endereco" not in nomes or "descricao" not in nomes or nomes.count("valor") != len(COLUNAS_VALORES):
+            return None
+
+        valores = iter(COLUNAS_VALORES)
+        nomes = [next(valores) if nome == "valor" else nome for nome in nomes]
+        centros = [segmento.centro for segmento, _ in titulos]
+        limites = [(esquerda + direita) / 2 for esquerda, direita in zip(centros, centros[1:])]
+        return cls(inicio_primeira=titulos[0][0].x0 - FOLGA_COLUNA_ITEM, nomes=nomes, limites=limites)
+
+    def classificar(self, segmento: _Segmento, inicios: Optional[Dict[str, float]] = None) -> str:
+        """
+        Retorna a coluna do trecho. Com `inicios` (onde começa cada célula na linha do
+        lote), um trecho alinhado à esquerda com uma dessas células fica na mesma coluna,
+        o que acerta os trechos curtos no início de colunas largas (ex: o "1." que
+        termina a descrição).
+        """
+        if inicios:
+            for nome, inicio in inicios.items():
+                if abs(segmento.x0 - inicio) <= TOLERANCIA_ALINHAMENTO:
+                    return nome
+        if segmento.x1 <= self.inicio_primeira:
+            return "item"
+        centro = segmento.centro
+        for nome, limite in zip(self.nomes, self.limites):
+            if centro < limite:
+                return nome
+        return self.nomes[-1]
+
+
+@dataclass
+class _LoteAberto:
+    id_lote: int
+    estado: str
+    cidade: str
+    pagina: int
+    inicios: Dict[str, float] = field(default_factory=dict)
+    celulas: Dict[str, List[str]] = field(default_factory=dict)
+
+    def adicionar(self, celulas: Dict[str, str]):
+        for nome, texto in celulas.items():
+            self.celulas.setdefault(nome, []).append(texto)
+
+    def texto(self, nome: str) -> str:
+        return " ".join(" ".join(self.celulas.get(nome, [])).split())
+
+    def fechar(self, origem_edital: str) -> LoteEdital:
+        descricao = self.texto("descricao")
+        matricula = PADRAO_MATRICULA.search(descricao)
+        return LoteEdital(
+            id_lote=self.id_lote,
+            estado=self.estado,
+            cidade=self.cidade,
+            empreendimento=self.texto("empreendimento"),
+            endereco=self.texto("endereco"),
+            bairro=self.texto("bairro"),
+            descricao=descricao,
+            numero_bem=self.texto("numero_bem"),
+            matricula=matricula.group(1) if matricula else None,
+            valor_1_leilao=limpar_valor_monetario(self.texto("valor_1_leilao")),
+            valor_2_leilao=limpar_valor_monetario(self.texto("valor_2_leilao")),
+            valor_avaliacao=limpar_valor_monetario(self.texto("valor_avaliacao")),
+            origem_edital=origem_edital,
+            pagina=self.pagina,
+        )
+
+
+def _segmentos_pdfium(pagina) -> List[_Segmento]:
+    """
+    Trechos de texto da página lidos caractere a caractere pelo pdfium: uma quebra de
+    linha do texto, uma mudança de linha ou um espaço grande entre dois caracteres
+    começa um novo trecho (em geral, uma linha de uma célula).
+    """
+    altura = pagina.get_height()
+    texto_pagina = pagina.get_textpage()
+    try:
+        # O pdfium marca com U+FFFE o hífen no fim de uma linha
+        texto = texto_pagina.get_text_range().replace("\ufffe", "-")
+        segmentos = []
+        atual = None
+        for indice, caractere in enumerate(texto):
+            if caractere in "\r\n":
+                atual = None
+                continue
+            if caractere.isspace():
+                if atual:
+                    atual.texto += " "
+                continue
+            esquerda, baixo, direita, _ = texto_pagina.get_charbox(indice, loose=True)
+            # Com loose=True a caixa segue a fonte, e não o desenho do caractere (ex: o apóstrofo)
+            base = altura - baixo
+            if atual and abs(base - atual.topo) <= TOLERANCIA_LINHA and esquerda - atual.x1 <= ESPACO_MAXIMO_PALAVRAS:
+                atual.texto += caractere
+                atual.x1 = max(atual.x1, direita)
+            else:
+                atual = _Segmento(esquerda, direita, base, caractere)
+                segmentos.append(atual)
+    finally:
+        texto_pagina.close()
+    for segmento in segmentos:
+        segmento.texto = segmento.texto.strip()
+    return segmentos
+
+
+def _segmentos_pdfplumber(pagina) -> List[_Segmento]:
+    """
+    Palavras da página (page.extract_words) juntadas em trechos: palavras vizinhas na
+    mesma linha, com pouco espaço entre elas, pertencem à mesma célula.
+    """
+    segmentos = []
+    for palavra in sorted(pagina.extract_words(), key=lambda p: (round(p["top"]), p["x0"])):
+        anterior = segmentos[-1] if segmentos else None
+        if (
+            anterior
+            and abs(palavra["top"] - anterior.topo) <= TOLERANCIA_LINHA
+            and 0 <= palavra["x0"] - anterior.x1 <= ESPACO_MAXIMO_PALAVRAS
+        ):
+            anterior.x1 = palavra["x1"]
+            anterior.texto = f"{anterior.texto} {palavra['text']}"
+        else:
+            segmentos.append(_Segmento(palavra["x0"], palavra["x1"], palavra["top"], palavra["text"]))
+    return segmentos
+
+
+def _agrupar_linhas(segmentos: List[_Segmento]) -> List[List[_Segmento]]:
+    """
+    Agrupa os trechos em linhas (de cima para baixo), cada uma ordenada da esquerda
+    para a direita.
+    """
+    linhas = []
+    for segmento in sorted(segmentos, key=lambda s: s.topo):
+        if linhas and segmento.topo - linhas[-1][0].topo <= TOLERANCIA_LINHA:
+            linhas[-1].append(segmento)
+        else:
+            linhas.append([segmento])
+    return [sorted(linha, key=lambda s: s.x0) for linha in linhas]
+
+
+def _linhas_da_tabela(linhas: List[List[_Segmento]]) -> List[List[_Segmento]]:
+    """
+    Remove as linhas do cabeçalho e do rodapé da página.
+    """
+    textos = [" ".join(s.texto for s in linha) for linha in linhas]
+    inicio = next((i + 1 for i, texto in enumerate(textos) if PADRAO_FIM_CABECALHO_PAGINA.search(texto)), 0)
+    fim = next((i for i, texto in enumerate(textos) if PADRAO_INICIO_RODAPE_PAGINA.search(texto)), len(linhas))
+    return linhas[inicio:fim]
+
+
+def _iterar_paginas_segmentos(caminho_completo: str, faixas: Iterable[Tuple[int, int]], fonte: str) -> Iterator[Tuple[int, List[_Segmento]]]:
+    if fonte == "pdfium":
+        pdf = pdfium.PdfDocument(caminho_completo)
+        try:
+            for inicio, fim in faixas:
+                for indice in range(inicio, fim):
+                    pagina = pdf[indice]
+                    yield indice, _segmentos_pdfium(pagina)
+                    pagina.close()
+        finally:
+            pdf.close()
+    elif fonte == "pdfplumber":
+        with pdfplumber.open(caminho_completo) as pdf:
+            for inicio, fim in faixas:
+                for indice in range(inicio, fim):
+                    pagina = pdf.pages[indice]
+                    yield indice, _segmentos_pdfplumber(pagina)
+                    pagina.close()
+    else:
+        raise ValueError(f"Fonte de texto desconhecida: {fonte}")
+
+
+def iterar_lotes_geometria(
+    caminho_completo: str,
+    faixas: Optional[Iterable[Tuple[int, int]]] = None,
+    fonte: str = "pdfium",
+) -> Iterator[LoteEdital]:
+    """
+    Lê os lotes do edital pela posição do texto na página, coluna a coluna.
+
+    Os limites das colunas vêm dos títulos de cada tabela ("Empreendimento", "Endereço",
+    ..., "Valor de Avaliação") e valem para as páginas seguintes até o próximo título,
+    então cada layout de edital é medido no próprio PDF. Um lote começa na linha com o
+    número do item e os valores nas colunas de valor; as linhas seguintes completam as
+    suas células, inclusive na página seguinte.
+
+    `faixas` são as faixas de páginas [inicio, fim) a ler (por padrão, as detectadas por
+    detectar_paginas_imoveis). `fonte` escolhe de onde vêm as posições do texto: "pdfium"
+    (rápido) ou "pdfplumber" (page.extract_words).
+    """
+    nome_arquivo = os.path.basename(caminho_completo)
+    if faixas is None:
+        faixas = detectar_paginas_imoveis(caminho_completo)
+
+    estado_atual, cidade_atual = "", ""
+    colunas: Optional[_Colunas] = None
+    lote_aberto: Optional[_LoteAberto] = None
+
+    for indice_pagina, segmentos in _iterar_paginas_segmentos(caminho_completo, faixas, fonte):
+        for linha in _linhas_da_tabela(_agrupar_linhas(segmentos)):
+            texto_linha = " ".join(segmento.texto for segmento in linha)
+            estado_match = PADRAO_ESTADO.search(texto_linha)
+            cidade_match = PADRAO_CIDADE.search(texto_linha)
+            if estado_match or cidade_match:
+                if lote_aberto:
+                    yield lote_aberto.fechar(nome_arquivo)
+                lote_aberto = None
+                if estado_match:
+                    estado_atual, cidade_atual = estado_match.group(1).strip(), ""
+                if cidade_match:
+                    cidade_atual = " ".join(cidade_match.group(1).split())
+                continue
+
+            colunas_cabecalho = _Colunas.do_cabecalho(linha)
+            if colunas_cabecalho:
+                colunas = colunas_cabecalho
+                continue
+            if colunas is None or all(PADRAO_RESTO_CABECALHO.match(s.texto.strip()) for s in linha):
+                continue
+
+            inicios: Dict[str, float] = {}
+            celulas: Dict[str, str] = {}
+            for segmento in linha:
+                nome = colunas.classificar(segmento, lote_aberto.inicios if lote_aberto else None)
+                inicios.setdefault(nome, segmento.x0)
+                celulas[nome] = f"{celulas[nome]} {segmento.texto}" if nome in celulas else segmento.texto
+
+            if celulas.get("item", "").isdigit():
+                # O número do item sempre começa um lote; lotes sem valores (ex: "ANULADO")
+                # são descartados, como no parser de texto
+                if lote_aberto:
+                    yield lote_aberto.fechar(nome_arquivo)
+                lote_aberto = None
+                tem_valores = (
+                    PADRAO_VALOR_CELULA.match(celulas.get("valor_1_leilao", ""))
+                    and PADRAO_VALOR_CELULA.match(celulas.get("valor_2_leilao", ""))
+                )
+                if tem_valores and estado_atual and cidade_atual:
+                    lote_aberto = _LoteAberto(int(celulas.pop("item")), estado_atual, cidade_atual, indice_pagina + 1, inicios)
+            if lote_aberto:
+                lote_aberto.adicionar(celulas)
+
+    if lote_aberto:
+        yield lote_aberto.fechar(nome_arquivo)
+
+
+def gerar_relatorio_comparacao(pasta_pdfs: str, fonte: str = "pdfium") -> dict:
+    """
+    Compara, para cada edital da pasta, os lotes lidos pela geometria com os do parser de
+    texto (processador_pdf), lote a lote pelo número do item, e mede o tempo de cada modo.
+    """
+    relatorio = {"fonte_geometria": fonte, "editais": {}}
+    campos = ("estado", "cidade", "matricula", "valor_1_leilao", "valor_2_leilao")
+
+    for nome_arquivo in sorted(os.listdir(pasta_pdfs)):
+        if not nome_arquivo.lower().endswith(".pdf"):
+            continue
+        caminho = os.path.join(pasta_pdfs, nome_arquivo)
+        faixas = detectar_paginas_imoveis(caminho)
+        num_paginas = sum(fim - inicio for inicio, fim in faixas)
+
+        inicio = time.perf_counter()
+        lotes_texto = list(iterar_imoveis_das_paginas(_iterar_faixas_pdf(caminho, faixas), nome_arquivo))
+        tempo_texto = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        lotes_geometria = list(iterar_lotes_geometria(caminho, faixas, fonte))
+        tempo_geometria = time.perf_counter() - inicio
+
+        por_item_texto = {lote["id_lote"]: lote for lote in lotes_texto}
+        por_item_geometria = {lote.id_lote: lote for lote in lotes_geometria}
+        divergencias = []
+        for id_lote in sorted(por_item_texto.keys() & por_item_geometria.keys()):
+            texto, geometria = por_item_texto[id_lote], por_item_geometria[id_lote]
+            valores_texto = {
+                "estado": texto["estado"],
+                "cidade": texto["cidade"],
+                "matricula": texto["matricula"],
+                "valor_1_leilao": limpar_valor_monetario(texto["valor1_str"]),
+                "valor_2_leilao": limpar_valor_monetario(texto["valor2_str"]),
+            }
+            diferentes = {
+                campo: {"texto": valores_texto[campo], "geometria": getattr(geometria, campo)}
+                for campo in campos
+                if valores_texto[campo] != getattr(geometria, campo)
+            }
+            if diferentes:
+                divergencias.append({"id_lote": id_lote, "pagina": geometria.pagina, "campos": diferentes})
+
+        relatorio["editais"][nome_arquivo] = {
+            "paginas": num_paginas,
+            "lotes_texto": len(lotes_texto),
+            "lotes_geometria": len(lotes_geometria),
+            "itens_repetidos_texto": len(lotes_texto) - len(por_item_texto),
+            "itens_repetidos_geometria": len(lotes_geometria) - len(por_item_geometria),
+            "iguais": len(por_item_texto.keys() & por_item_geometria.keys()) - len(divergencias),
+            "so_texto": sorted(por_item_texto.keys() - por_item_geometria.keys()),
+            "so_geometria": sorted(por_item_geometria.keys() - por_item_texto.keys()),
+            "divergencias": divergencias,
+            "segundos_por_pagina_texto": round(tempo_texto / max(num_paginas, 1), 4),
+            "segundos_por_pagina_geometria": round(tempo_geometria / max(num_paginas, 1), 4),
+        }
+    return relatorio
+
+
+if __name__ == "__main__":
+    # Uso: python extracao_geometria.py [pasta_dos_editais] [relatorio.json] [pdfium|pdfplumber]
+    PASTA_DOS_EDITAIS = sys.argv[1] if len(sys.argv) > 1 else "editais_baixados"
+    ARQUIVO_RELATORIO = sys.argv[2] if len(sys.argv) > 2 else "relatorio_geometria.json"
+    FONTE = sys.argv[3] if len(sys.argv) > 3 else "pdfium"
+
+    relatorio = gerar_relatorio_comparacao(PASTA_DOS_EDITAIS, FONTE)
+    with open(ARQUIVO_RELATORIO, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    for nome_arquivo, resumo in relatorio["editais"].items():
+        print(
+            f"{nome_arquivo}: texto={resumo['lotes_texto']} geometria={resumo['lotes_geometria']} "
+            f"iguais={resumo['iguais']} divergentes={len(resumo['divergencias'])} "
+            f"só texto={len(resumo['so_texto'])} só geometria={len(resumo['so_geometria'])} | "
+            f"{resumo['segundos_por_pagina_texto']}s/página (texto) x {resumo['segundos_por_pagina_geometria']}s/página (geometria)"
+        )
+    print(f"Relatório salvo em {ARQUIVO_RELATORIO}")
@@ -0,0 +1,138 @@
+# fila_automacao.py
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+import metricas
+
+# Etapas acompanhadas em cada execução, na ordem em que acontecem
+ETAPAS = ("download", "extracao", "filtro", "persistencia")
+# Quantos jobs finalizados continuam disponíveis para consulta
+MAX_JOBS_HISTORICO = 500
+
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+@dataclass
+class Etapa:
+    status: str = "pendente"  # pendente, executando, concluida, falhou
+    inicio: Optional[str] = None
+    fim: Optional[str] = None
+    duracao_segundos: float = 0.0
+
+
+@dataclass
+class Job:
+    id: str
+    ano: int
+    mes: str
+    estado: str
+    status: str = "na_fila"  # na_fila, executando, concluido, falhou
+    criado_em: str = field(default_factory=_agora)
+    iniciado_em: Optional[str] = None
+    finalizado_em: Optional[str] = None
+    etapas: Dict[str, Etapa] = field(default_factory=lambda: {nome: Etapa() for nome in ETAPAS})
+    resultado: Optional[dict] = None
+    erro: Optional[str] = None
+
+    @contextmanager
+    def medir_etapa(self, nome: str):
+        """
+        Marca o início e o fim de uma etapa. Uma etapa pode ser medida várias vezes
+        (ex: extração de cada PDF); a duração é acumulada.
+        """
+        etapa = self.etapas.setdefault(nome, Etapa())
+        etapa.status = "executando"
+        etapa.inicio = etapa.inicio or _agora()
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            etapa.status = "falhou"
+            raise
+        finally:
+            etapa.duracao_segundos = round(etapa.duracao_segundos + time.perf_counter() - inicio, 3)
+            etapa.fim = _agora()
+        etapa.status = "concluida"
+
+    @property
+    def ativo(self) -> bool:
+        return self.status in ("na_fila", "executando")
+
+
+class FilaAutomacao:
+    """
+    Executa as buscas da automação em um pool limitado de threads, fora do event loop
+    da API.
+
+    Pedidos iguais (mesmo ano, mês e estado) enquanto um job ainda está na fila ou em
+    execução não geram um novo job: recebem o job já existente.
+
+    `funcao` é chamada como funcao(ano, mes, estado, medir_etapa=job.medir_etapa) e o
+    valor retornado (um dicionário) fica em job.resultado.
+    """
+
+    def __init__(self, funcao: Callable[..., Optional[dict]], max_workers: int = 1):
+        self._funcao = funcao
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="automacao")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._ativos: Dict[Tuple[int, str, str], Job] = {}
+        self._lock = threading.Lock()
+
+    def enviar(self, ano: int, mes: str, estado: str) -> Tuple[Job, bool]:
+        """
+        Coloca a busca na fila. Retorna o job e se ele foi criado agora (False quando o
+        pedido foi agrupado com um job idêntico ainda ativo).
+        """
+        chave = (ano, mes.strip(), estado.strip().upper())
+        with self._lock:
+            job_existente = self._ativos.get(chave)
+            if job_existente is not None and job_existente.ativo:
+                return job_existente, False
+
+            job = Job(id=uuid.uuid4().hex, ano=chave[0], mes=chave[1], estado=chave[2])
+            self._jobs[job.id] = job
+            self._ativos[chave] = job
+            self._descartar_antigos()
+
+        self._executor.submit(self._executar, chave, job)
+        return job, True
+
+    def obter(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _executar(self, chave: Tuple[int, str, str], job: Job):
+        job.status = "executando"
+        job.iniciado_em = _agora()
+        try:
+            job.resultado = self._funcao(job.ano, job.mes, job.estado, medir_etapa=job.medir_etapa)
+            job.status = "concluido"
+        except Exception as e:
+            print(f"ERRO: Job {job.id} ({job.mes}/{job.ano} de {job.estado}) falhou. Erro: {e}")
+            metricas.incrementar("automacao_falhas_total", etapa="job")
+            job.erro = str(e)
+            job.status = "falhou"
+        finally:
+            job.finalizado_em = _agora()
+            with self._lock:
+                if self._ativos.get(chave) is job:
+                    del self._ativos[chave]
+
+    def _descartar_antigos(self):
+        # Mantém o histórico limitado, sem nunca descartar jobs ativos
+        excedente = len(self._jobs) - MAX_JOBS_HISTORICO
+        for job_id in list(self._jobs):
+            if excedente <= 0:
+                break
+            if not self._jobs[job_id].ativo:
+                del self._jobs[job_id]
+                excedente -= 1
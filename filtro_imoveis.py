@@ -0,0 +1,217 @@
+# filtro_imoveis.py
+
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Provisão mínima (Valor 1º Leilão - Valor 2º Leilão) para aprovar um imóvel
+PROVISAO_MINIMA_PADRAO = 5000.0
+
+# Qualquer caractere fora de um valor "1.234,56" (o separador entre valores é "\n")
+_PADRAO_FORA_DO_FORMATO = re.compile(r"[^0-9.,\n]")
+
+
+def limpar_valor_monetario(valor_str: str) -> float:
+    if not isinstance(valor_str, str):
+        return 0.0
+    valor_limpo = re.sub(r'[R$\s.]', '', valor_str).replace(',', '.')
+    try:
+        return float(valor_limpo)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def converter_valores_brl(valores: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    Converte vários valores em reais ("1.234,56") de uma vez, com o mesmo resultado de
+    limpar_valor_monetario para cada um.
+
+    Os valores são juntados em um único texto, os separadores são trocados de uma vez
+    só e o NumPy converte todos para float. Se algum valor fugir do formato (ex: "R$",
+    texto vazio), o lote inteiro é lido um valor por vez.
+    """
+    try:
+        texto = "\n".join(valores)
+    except TypeError:
+        texto = None
+    if texto is not None and not _PADRAO_FORA_DO_FORMATO.search(texto):
+        partes = texto.replace(".", "").replace(",", ".").split("\n")
+        if len(partes) == len(valores):
+            try:
+                return np.array(partes, dtype=np.float64)
+            except ValueError:
+                pass
+    return np.array([limpar_valor_monetario(valor) for valor in valores], dtype=np.float64)
+
+
+def _normalizar(texto: Optional[str]) -> str:
+    return " ".join((texto or "").split()).upper()
+
+
+@dataclass
+class RegrasFiltro:
+    """
+    Regras de aprovação dos imóveis extraídos. Um imóvel é aprovado quando os dois
+    valores de leilão são positivos e a provisão (Valor 1º Leilão - Valor 2º Leilão)
+    atinge o mínimo da sua cidade, ou do seu estado, ou `provisao_minima`, nessa ordem.
+
+    `desconto_minimo_pct` exige ainda que a provisão seja pelo menos esse percentual do
+    Valor 1º Leilão, e `estados` (se informado) limita os estados aceitos. As cidades
+    de `provisao_minima_por_cidade` são indicadas como "UF/CIDADE" (ex: "SP/CAMPINAS").
+    Estados e cidades são comparados sem diferenciar maiúsculas.
+    """
+
+    provisao_minima: float = PROVISAO_MINIMA_PADRAO
+    desconto_minimo_pct: Optional[float] = None
+    estados: Optional[List[str]] = None
+    provisao_minima_por_estado: Dict[str, float] = field(default_factory=dict)
+    provisao_minima_por_cidade: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def de_dict(cls, dados: dict) -> "RegrasFiltro":
+        campos_invalidos = set(dados) - set(cls.__dataclass_fields__)
+        if campos_invalidos:
+            raise ValueError(f"Regras de filtro desconhecidas: {', '.join(sorted(campos_invalidos))}")
+        regras = cls(**dados)
+        for chave in regras.provisao_minima_por_cidade:
+            if "/" not in chave:
+                raise ValueError(f"Cidade '{chave}' deve ser informada como UF/CIDADE.")
+        return regras
+
+    def assinatura(self) -> str:
+        """
+        Texto que identifica as regras, guardado no cache junto com os imóveis aprovados
+        para saber se eles precisam ser filtrados de novo.
+        """
+        return json.dumps(asdict(self), sort_keys=True, ensure_ascii=False)
+
+
+def carregar_regras(caminho: Optional[str]) -> RegrasFiltro:
+    """
+    Lê as regras de um arquivo JSON com os campos de RegrasFiltro. Sem arquivo, usa as
+    regras padrão (só a provisão mínima de R$ 5.000,00).
+    """
+    if not caminho:
+        return RegrasFiltro()
+    with open(caminho, encoding="utf-8") as f:
+        return RegrasFiltro.de_dict(json.load(f))
+
+
+class LotesColunares:
+    """
+    Lotes extraídos dos editais organizados em colunas (arrays do NumPy), para que a
+    leitura dos valores e as regras de aprovação rodem sobre todos os lotes de uma vez.
+
+    Estado e cidade são guardados como códigos inteiros de um dicionário de valores
+    distintos. Os dicionários originais continuam referenciados, para montar os
+    imóveis aprovados sem copiar os textos.
+    """
+
+    def __init__(self, imoveis_brutos: List[dict]):
+        self.imoveis = imoveis_brutos
+        self.valor_1_leilao = converter_valores_brl([imovel["valor1_str"] for imovel in imoveis_brutos])
+        self.valor_2_leilao = converter_valores_brl([imovel["valor2_str"] for imovel in imoveis_brutos])
+        self.provisao = self.valor_1_leilao - self.valor_2_leilao
+
+        self.estados: Dict[str, int] = {}
+        self.cidades: Dict[str, int] = {}
+        self.codigo_estado = np.fromiter(
+            (self.estados.setdefault(_normalizar(imovel["estado"]), len(self.estados)) for imovel in imoveis_brutos),
+            dtype=np.int32, count=len(imoveis_brutos),
+        )
+        self.codigo_cidade = np.fromiter(
+            (
+                self.cidades.setdefault(f"{_normalizar(imovel['estado'])}/{_normalizar(imovel['cidade'])}", len(self.cidades))
+                for imovel in imoveis_brutos
+            ),
+            dtype=np.int32, count=len(imoveis_brutos),
+        )
+
+    def __len__(self) -> int:
+        return len(self.imoveis)
+
+    def aprovados(self, regras: RegrasFiltro) -> np.ndarray:
+        """
+        Retorna a máscara dos lotes aprovados pelas regras.
+        """
+        provisao_minima = np.full(len(self), float(regras.provisao_minima))
+        for estado, minimo in regras.provisao_minima_por_estado.items():
+            codigo = self.estados.get(_normalizar(estado))
+            if codigo is not None:
+                provisao_minima[self.codigo_estado == codigo] = minimo
+        for cidade, minimo in regras.provisao_minima_por_cidade.items():
+            estado, _, nome_cidade = cidade.partition("/")
+            codigo = self.cidades.get(f"{_normalizar(estado)}/{_normalizar(nome_cidade)}")
+            if codigo is not None:
+                provisao_minima[self.codigo_cidade == codigo] = minimo
+
+        mascara = (self.valor_1_leilao > 0) & (self.valor_2_leilao > 0) & (self.provisao >= provisao_minima)
+        if regras.desconto_minimo_pct is not None:
+            mascara &= self.provisao >= self.valor_1_leilao * (regras.desconto_minimo_pct / 100)
+        if regras.estados is not None:
+            codigos = [self.estados[estado] for estado in map(_normalizar, regras.estados) if estado in self.estados]
+            mascara &= np.isin(self.codigo_estado, codigos)
+        return mascara
+
+    def filtrar(self, regras: RegrasFiltro) -> List[dict]:
+        """
+        Retorna os imóveis aprovados pelas regras, no formato gravado pela API.
+        """
+        imoveis_aprovados = []
+        for indice in np.flatnonzero(self.aprovados(regras)).tolist():
+            imovel_data = self.imoveis[indice]
+            valor1, valor2 = float(self.valor_1_leilao[indice]), float(self.valor_2_leilao[indice])
+            imoveis_aprovados.append({
+                "id_lote": imovel_data["id_lote"],
+                "estado": imovel_data["estado"],
+                "cidade": imovel_data["cidade"],
+                "endereco": imovel_data["endereco"],
+                "matricula": imovel_data["matricula"],
+                "valor_1_leilao": valor1,
+                "valor_2_leilao": valor2,
+                "provisao": round(valor1 - valor2, 2),
+                "origem_edital": imovel_data["origem_edital"],
+            })
+        return imoveis_aprovados
+
+
+def carregar_lotes_do_cache(pasta_cache: str) -> LotesColunares:
+    """
+    Junta em um único lote colunar os imóveis extraídos de todos os editais guardados
+    no cache de extração (ver cache_extracao), sem abrir nenhum PDF. Editais que
+    falharam ou ainda não passaram pelo parser são ignorados.
+    """
+    imoveis_brutos = []
+    for nome_arquivo in sorted(os.listdir(pasta_cache)):
+        if not nome_arquivo.endswith(".json.gz"):
+            continue
+        try:
+            with gzip.open(os.path.join(pasta_cache, nome_arquivo), "rt", encoding="utf-8") as f:
+                entrada = json.load(f)
+        except (OSError, ValueError):
+            continue
+        imoveis_brutos.extend(entrada.get("imoveis_brutos") or [])
+    return LotesColunares(imoveis_brutos)
+
+
+if __name__ == "__main__":
+    # Uso: python filtro_imoveis.py [pasta_do_cache] [regras.json]
+    from cache_extracao import PASTA_CACHE
+
+    pasta_cache = sys.argv[1] if len(sys.argv) > 1 else os.path.join("editais_baixados", PASTA_CACHE)
+    regras = carregar_regras(sys.argv[2] if len(sys.argv) > 2 else None)
+
+    inicio = time.perf_counter()
+    lotes = carregar_lotes_do_cache(pasta_cache)
+    print(f"{len(lotes)} lotes carregados do cache em {time.perf_counter() - inicio:.3f}s")
+
+    inicio = time.perf_counter()
+    aprovados = lotes.filtrar(regras)
+    print(f"{len(aprovados)} imóveis aprovados em {time.perf_counter() - inicio:.3f}s com as regras {regras.assinatura()}")
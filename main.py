@@ -1,20 +1,65 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import Callable, ContextManager, List, Dict, Optional, Tuple
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import asdict
 import scraper_caixa
 import processador_pdf
+import armazenamento
+import cache_respostas
+import fila_automacao
+import filtro_imoveis
+import metricas
+import planejador_backfill
+from metricas import log_detalhado
+from baixador_http import BaixadorHTTP
 import os
 
+# Processos usados na leitura dos PDFs
+WORKERS_EXTRACAO = os.cpu_count() or 1
+# Onde os imóveis ficam guardados: caminho do banco SQLite ou "memoria"
+DESTINO_BANCO = os.environ.get("IMOVEIS_DB", "imoveis.db")
+# Maior página aceita em GET /imoveis/?limite=
+LIMITE_MAXIMO_PAGINA = 1000
+# Tamanho da página de GET /imoveis/search quando `limite` não é informado
+LIMITE_PADRAO_BUSCA = 50
+# Memória (em MB) para guardar listagens já serializadas; 0 desliga o cache
+CACHE_RESPOSTAS_MB = int(os.environ.get("CACHE_RESPOSTAS_MB", "256"))
+# Quantas buscas da automação podem rodar ao mesmo tempo (cada uma abre um Chrome)
+MAX_JOBS_SIMULTANEOS = int(os.environ.get("MAX_JOBS_AUTOMACAO", "1"))
+# Como os PDFs são baixados: "navegador" (cliques no Chrome) ou "http" (download direto)
+MODO_DOWNLOAD = os.environ.get("MODO_DOWNLOAD", "navegador")
+# Pasta de fixtures para o modo "http" responder sem acessar o site (ver baixador_http)
+PASTA_REPLAY = os.environ.get("REPLAY_DOWNLOADS")
+# Como os lotes são lidos dos PDFs: "texto" ou "geometria" (ver processador_pdf.MODOS_EXTRACAO)
+MODO_EXTRACAO = os.environ.get("MODO_EXTRACAO", processador_pdf.MODO_TEXTO)
+# Arquivo JSON com as regras de aprovação dos imóveis (ver filtro_imoveis.RegrasFiltro)
+REGRAS_FILTRO = filtro_imoveis.carregar_regras(os.environ.get("REGRAS_FILTRO"))
+
+# Navegadores reaproveitados entre as buscas (abertos sob demanda, um por job simultâneo)
+pool_navegadores = scraper_caixa.PoolNavegadores(tamanho=MAX_JOBS_SIMULTANEOS)
+# Cliente HTTP compartilhado pelos jobs no modo de download direto
+baixador_http = BaixadorHTTP(replay=PASTA_REPLAY) if MODO_DOWNLOAD == "http" else None
+
 # --- MÓDULOS DA AUTOMAÇÃO (ainda como placeholders) ---
 # No futuro, você substituirá o conteúdo dessas funções pelo código real
 # do Selenium e do Pdfplumber que discutimos.
 
-def baixar_e_processar_editais(ano: float, mes: str, estado: str) -> List[Dict]:
+def baixar_e_processar_editais(
+    ano: float, mes: str, estado: str, medir_etapa: Optional[Callable[[str], ContextManager]] = None
+) -> Tuple[List[Dict], Optional[str]]:
     """
     Executa o fluxo real de automação: baixa os editais e depois processa os PDFs.
+    O download do mês fica registrado no checkpoint do período (ver planejador_backfill)
+    e não é repetido depois que o mês termina, enquanto os arquivos estiverem intactos.
+
+    Retorna os imóveis aprovados e o erro do download, se houve um. Mesmo com a falha
+    (a etapa "download" fica como falhou), o que chegou a ser baixado é processado.
     """
+    medir_etapa = medir_etapa or (lambda etapa: nullcontext())
     # Define o nome da pasta onde os arquivos serão salvos e lidos.
     pasta_dos_editais = "editais_baixados"
     
@@ -25,19 +70,28 @@ def baixar_e_processar_editais(ano: float, mes: str, estado: str) -> List[Dict]:
             arquivos_ja_processados = set(f.read().splitlines())
 
     # 1. Chama o robô do scraper_caixa para baixar os arquivos
-    print(f"Iniciando download dos editais para {mes}/{ano} de {estado}...")
-    scraper_caixa.baixar_editais_por_mes(
-        ano=ano,
-        mes_texto=mes,
-        estado_sigla=estado,
-        pasta_download=pasta_dos_editais,
-        arquivos_existentes=list(arquivos_ja_processados)
-    )
-    print("Download dos editais concluído.")
+    log_detalhado(f"Iniciando download dos editais para {mes}/{ano} de {estado}...")
+    unidade = planejador_backfill.UnidadeBackfill.de_mes_texto(estado, ano, mes)
+    erro_download = None
+    try:
+        with medir_etapa("download"):
+            planejador_backfill.baixar_unidade(
+                unidade,
+                planejador_backfill.CheckpointsBackfill(pasta_dos_editais),
+                pool=pool_navegadores,
+                baixador=baixador_http
+            )
+        log_detalhado("Download dos editais concluído.")
+    except Exception as e:
+        # O scraper já exibiu o problema, que também fica no checkpoint do período
+        erro_download = str(e)
 
     # 2. Chama o processador_pdf para ler os arquivos baixados e filtrar os imóveis
-    print("Iniciando processamento dos PDFs baixados...")
-    imoveis_reais_filtrados = processador_pdf.processar_pdfs_e_filtrar(pasta_dos_editais, arquivos_ja_processados)
+    log_detalhado("Iniciando processamento dos PDFs baixados...")
+    imoveis_reais_filtrados = processador_pdf.processar_pdfs_e_filtrar(
+        pasta_dos_editais, arquivos_ja_processados, workers=WORKERS_EXTRACAO, medir_etapa=medir_etapa,
+        regras=REGRAS_FILTRO, modo_extracao=MODO_EXTRACAO
+    )
     print(f"Processamento concluído. {len(imoveis_reais_filtrados)} imóveis aprovados encontrados.")
 
     # Salva os novos arquivos processados
@@ -48,18 +102,28 @@ def baixar_e_processar_editais(ano: float, mes: str, estado: str) -> List[Dict]:
                 f.write(f"{arquivo}\n")
 
     # 3. Retorna os dados reais que foram extraídos
-    return imoveis_reais_filtrados
+    return imoveis_reais_filtrados, erro_download
 
 # --- ESTRUTURA DA API ---
 
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    yield
+    pool_navegadores.fechar()
+    if baixador_http is not None:
+        baixador_http.fechar()
+
 app = FastAPI(
     title="API de Automação de Cadastro de Imóveis",
-    description="Gerencia o processo de busca e o armazenamento de imóveis de leilão da Caixa."
+    description="Gerencia o processo de busca e o armazenamento de imóveis de leilão da Caixa.",
+    lifespan=ciclo_de_vida
 )
 
-# Modelo Pydantic para o Imóvel
-class Imovel(BaseModel):
-    id: int
+# Modelo Pydantic para o Imóvel ainda não gravado (sem id)
+class ImovelNovo(BaseModel):
+    id_lote: Optional[int] = None
+    estado: Optional[str] = None
+    cidade: Optional[str] = None
     endereco: str
     matricula: Optional[str] = None # Adicionamos o campo de matricula
     valor_1_leilao: float
@@ -68,69 +132,262 @@ class Imovel(BaseModel):
     origem_edital: str
     status: str = "novo" # Status para controlar o fluxo (ex: novo, cadastrado, ignorado)
 
+# Modelo Pydantic para o Imóvel
+class Imovel(ImovelNovo):
+    id: int
+
+# Valida uma lista inteira de imóveis de uma só vez
+validador_lote_imoveis = TypeAdapter(List[ImovelNovo])
+
 # Modelo para atualização, permitindo alterar apenas o status
 class ImovelUpdate(BaseModel):
     status: str
 
-# "Banco de dados" em memória para armazenar os imóveis encontrados
-db_imoveis: Dict[int, Imovel] = {}
+# Banco de dados onde os imóveis encontrados são armazenados
+db_imoveis: armazenamento.ArmazenamentoImoveis = armazenamento.criar_armazenamento(DESTINO_BANCO)
+# Listagens já serializadas, reaproveitadas enquanto nenhum imóvel mudar
+cache_listagens = cache_respostas.CacheRespostas(max_bytes=CACHE_RESPOSTAS_MB * 2**20)
 
 # --- LÓGICA DA AUTOMAÇÃO EM SEGUNDO PLANO ---
 
-def executar_logica_e_salvar(ano: int, mes: str, estado: str):
+def salvar_imoveis(imoveis: List[Dict]) -> armazenamento.ResultadoGravacao:
+    """
+    Valida o lote inteiro antes de gravar e grava tudo no nosso db em uma única
+    transação. Imóveis que já estavam no db (mesma matrícula e cidade, ou mesmo
+    endereço) não são duplicados: só são atualizados se algo mudou.
+    """
+    with metricas.medir("validacao"):
+        registros = [imovel.model_dump() for imovel in validador_lote_imoveis.validate_python(imoveis)]
+    with metricas.medir("db_insercao"):
+        resultado = db_imoveis.gravar_lote(registros)
+    metricas.incrementar("automacao_imoveis_gravados_total", len(resultado.novos), operacao="novo")
+    metricas.incrementar("automacao_imoveis_gravados_total", len(resultado.atualizados), operacao="atualizado")
+    return resultado
+
+def executar_logica_e_salvar(
+    ano: int, mes: str, estado: str, medir_etapa: Optional[Callable[[str], ContextManager]] = None
+) -> dict:
     """
     Função que executa a automação e salva os resultados no nosso "banco de dados".
     """
-    imoveis_encontrados = baixar_e_processar_editais(ano, mes, estado)
+    medir_etapa = medir_etapa or (lambda etapa: nullcontext())
+    imoveis_encontrados, erro_download = baixar_e_processar_editais(ano, mes, estado, medir_etapa=medir_etapa)
     
-    # Adiciona os imóveis encontrados ao nosso db
-    for imovel_data in imoveis_encontrados:
-        novo_id = max(db_imoveis.keys() or [0]) + 1
-        novo_imovel = Imovel(id=novo_id, **imovel_data)
-        db_imoveis[novo_id] = novo_imovel
-        print(f"Imóvel ID {novo_id} adicionado: {novo_imovel.endereco}")
+    with medir_etapa("persistencia"):
+        gravacao = salvar_imoveis(imoveis_encontrados)
+    print(
+        f"{len(gravacao.novos)} imóveis adicionados, {len(gravacao.atualizados)} atualizados "
+        f"e {gravacao.inalterados} sem mudanças."
+    )
+
+    return {
+        "imoveis_encontrados": len(imoveis_encontrados),
+        "imoveis_adicionados": len(gravacao.novos),
+        "imoveis_atualizados": len(gravacao.atualizados),
+        "imoveis_inalterados": gravacao.inalterados,
+        "erro_download": erro_download,
+    }
+
+# Fila que executa as buscas fora das requisições, com concorrência limitada
+fila_jobs = fila_automacao.FilaAutomacao(executar_logica_e_salvar, max_workers=MAX_JOBS_SIMULTANEOS)
 
 # --- ENDPOINTS DA API ---
 
 @app.post("/automacao/executar", status_code=202)
-def iniciar_automacao(ano: int, mes: str, estado: str, background_tasks: BackgroundTasks):
+def iniciar_automacao(ano: int, mes: str, estado: str):
+    """
+    Coloca o processo de automação na fila de jobs e responde imediatamente.
+    Um pedido idêntico a um job ainda na fila ou em execução reaproveita esse job.
+    O andamento pode ser acompanhado em /automacao/jobs/{job_id}.
+    """
+    # Um mês inválido é recusado aqui, e não só quando o job for executado
+    try:
+        planejador_backfill.UnidadeBackfill.de_mes_texto(estado, ano, mes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    job, criado = fila_jobs.enviar(ano, mes, estado)
+    mensagem = (
+        "Processo de automação iniciado em segundo plano."
+        if criado
+        else "Já existe um processo de automação em andamento para este período e estado."
+    )
+    return {
+        "message": f"{mensagem} Os resultados estarão disponíveis em breve no endpoint /imoveis/.",
+        "job_id": job.id,
+        "status": job.status,
+        "url_status": f"/automacao/jobs/{job.id}",
+    }
+
+@app.get("/automacao/jobs/{job_id}")
+def consultar_job(job_id: str):
     """
-    Inicia o processo de automação em segundo plano.
-    Responde imediatamente com uma mensagem de sucesso.
+    Retorna o andamento de um job da automação, com a situação e o tempo de cada
+    etapa (download, extracao, filtro, persistencia).
     """
-    background_tasks.add_task(executar_logica_e_salvar, ano, mes, estado)
-    return {"message": "Processo de automação iniciado em segundo plano. Os resultados estarão disponíveis em breve no endpoint /imoveis/."}
+    job = fila_jobs.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return asdict(job)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def exportar_metricas():
+    """
+    Métricas da automação no formato do Prometheus: duração de cada etapa (início do
+    navegador, envio do formulário, downloads, leitura dos PDFs, parser, filtro e
+    gravação) e contadores de arquivos ignorados, lotes extraídos e aprovados e falhas.
+    Os valores são do processo que responde (cada worker do uvicorn tem os seus).
+    """
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _cabecalhos_proxima_pagina(request: Request, ultimo_id: int) -> Dict[str, str]:
+    proximo_cursor = str(ultimo_id)
+    return {
+        "X-Proximo-Cursor": proximo_cursor,
+        "Link": f'<{request.url.include_query_params(cursor=proximo_cursor)}>; rel="next"',
+    }
+
+def _ler_campos(fields: Optional[str]) -> Optional[List[str]]:
+    # Projeção pedida em `fields` (ex: "id,endereco,provisao"); None retorna todos os campos
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()] if fields else None
+    campos_invalidos = set(campos or []) - set(armazenamento.CAMPOS_CONSULTA)
+    if campos_invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconhecidos: {', '.join(sorted(campos_invalidos))}")
+    return campos
 
 @app.get("/imoveis/", response_model=List[Imovel])
-def listar_imoveis(status: Optional[str] = None):
+def listar_imoveis(
+    request: Request,
+    status: Optional[str] = None,
+    estado: Optional[str] = None,
+    cidade: Optional[str] = None,
+    origem_edital: Optional[str] = None,
+    provisao_min: Optional[float] = None,
+    provisao_max: Optional[float] = None,
+    cursor: Optional[int] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO_PAGINA),
+    fields: Optional[str] = None,
+    formato: str = Query("json", pattern="^(json|ndjson)$"),
+):
     """
-    Lista todos os imóveis encontrados pela automação.
-    Pode ser filtrado por status (ex: /imoveis/?status=novo).
+    Lista todos os imóveis encontrados pela automação, em ordem de ID.
+    Pode ser filtrado por status, estado, cidade, edital de origem e faixa de provisão
+    (ex: /imoveis/?status=novo&cidade=MANAUS&provisao_min=10000).
+
+    Paginação: com `limite`, a resposta traz no máximo esse número de imóveis e, se houver
+    mais, o cabeçalho `X-Proximo-Cursor` com o valor a enviar em `cursor` para a próxima
+    página (também no cabeçalho `Link`).
+    Projeção: `fields=id,endereco,provisao` retorna apenas esses campos (o id sempre vem).
+    Exportação: `formato=ndjson` transmite um imóvel por linha, sem montar a lista inteira.
+    Cache: as respostas JSON trazem `ETag` (com `If-None-Match`, a resposta é 304 enquanto
+    nada mudar) e vêm comprimidas se o cliente aceitar gzip.
     """
-    if status:
-        return [imovel for imovel in db_imoveis.values() if imovel.status == status]
-    return list(db_imoveis.values())
+    campos = _ler_campos(fields)
+
+    filtros = {
+        "status": status or None,
+        "estado": estado,
+        "cidade": cidade,
+        "origem_edital": origem_edital,
+        "provisao_min": provisao_min,
+        "provisao_max": provisao_max,
+        "campos": campos,
+    }
+
+    if formato == "ndjson":
+        paginas = (
+            b"".join(cache_respostas.serializar_json(imovel) + b"\n" for imovel in pagina)
+            for pagina in db_imoveis.iterar_paginas(apos_id=cursor, limite=limite, **filtros)
+        )
+        return StreamingResponse(paginas, media_type="application/x-ndjson")
+
+    def gerar():
+        imoveis = db_imoveis.listar(apos_id=cursor, limite=limite, **filtros)
+        headers = {}
+        if limite is not None and len(imoveis) == limite:
+            headers = _cabecalhos_proxima_pagina(request, imoveis[-1]["id"])
+        return imoveis, headers
+
+    # Os registros já foram validados na gravação; são serializados sem passar pelo modelo de novo
+    return cache_listagens.obter(str(request.url), db_imoveis.versao(), gerar).responder(request)
+
+# Declarada antes de /imoveis/{imovel_id}, senão "search" seria lido como um id
+@app.get("/imoveis/search")
+def buscar_imoveis(
+    request: Request,
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    estado: Optional[str] = None,
+    cidade: Optional[str] = None,
+    provisao_min: Optional[float] = None,
+    provisao_max: Optional[float] = None,
+    cursor: Optional[int] = None,
+    limite: int = Query(LIMITE_PADRAO_BUSCA, ge=1, le=LIMITE_MAXIMO_PAGINA),
+    fields: Optional[str] = None,
+):
+    """
+    Busca imóveis pelo texto do endereço, sem diferenciar acentos e maiúsculas, com os
+    mesmos filtros de /imoveis/ (ex: /imoveis/search?q=apartamento&estado=SP&provisao_min=10000).
+    Cada palavra de `q` precisa aparecer no endereço, e vale como início de palavra
+    ("apart" encontra "apartamento").
+
+    A resposta traz o total de imóveis encontrados, a quantidade por cidade (`facetas`)
+    e uma página de imóveis em ordem de ID, paginada como em /imoveis/ (também com ETag e gzip).
+    """
+    campos = _ler_campos(fields)
+
+    def gerar():
+        resultado = db_imoveis.buscar(
+            texto=q,
+            status=status or None,
+            estado=estado,
+            cidade=cidade,
+            provisao_min=provisao_min,
+            provisao_max=provisao_max,
+            apos_id=cursor,
+            limite=limite,
+            campos=campos,
+        )
+        headers = {}
+        if len(resultado.imoveis) == limite:
+            headers = _cabecalhos_proxima_pagina(request, resultado.imoveis[-1]["id"])
+        corpo = {
+            "total": resultado.total,
+            "facetas": {"cidade": resultado.facetas_cidade},
+            "imoveis": resultado.imoveis,
+        }
+        return corpo, headers
+
+    return cache_listagens.obter(str(request.url), db_imoveis.versao(), gerar).responder(request)
 
 @app.get("/imoveis/{imovel_id}", response_model=Imovel)
 def buscar_imovel(imovel_id: int):
     """
     Busca um imóvel específico pelo seu ID.
     """
-    if imovel_id not in db_imoveis:
+    imovel = db_imoveis.obter(imovel_id)
+    if imovel is None:
         raise HTTPException(status_code=404, detail="Imóvel não encontrado")
-    return db_imoveis[imovel_id]
+    return imovel
+
+@app.get("/imoveis/{imovel_id}/historico")
+def historico_imovel(imovel_id: int):
+    """
+    Retorna os preços do imóvel em cada edital em que ele apareceu com valores
+    diferentes, do mais antigo para o mais recente.
+    """
+    historico = db_imoveis.historico_precos(imovel_id)
+    if historico is None:
+        raise HTTPException(status_code=404, detail="Imóvel não encontrado")
+    return historico
 
 @app.put("/imoveis/{imovel_id}", response_model=Imovel)
 def atualizar_status_imovel(imovel_id: int, imovel_update: ImovelUpdate):
     """
     Atualiza o status de um imóvel (ex: para 'cadastrado').
     """
-    if imovel_id not in db_imoveis:
+    imovel_existente = db_imoveis.atualizar_status(imovel_id, imovel_update.status)
+    if imovel_existente is None:
         raise HTTPException(status_code=404, detail="Imóvel não encontrado")
-    
-    imovel_existente = db_imoveis[imovel_id]
-    imovel_existente.status = imovel_update.status
-    db_imoveis[imovel_id] = imovel_existente
     return imovel_existente
 
 @app.delete("/imoveis/{imovel_id}")
@@ -138,8 +395,7 @@ def deletar_imovel(imovel_id: int):
     """
     Remove um imóvel da lista.
     """
-    if imovel_id not in db_imoveis:
+    if not db_imoveis.remover(imovel_id):
         raise HTTPException(status_code=404, detail="Imóvel não encontrado")
     
-    del db_imoveis[imovel_id]
     return {"message": "Imóvel deletado com sucesso"}
\ No newline at end of file
@@ -0,0 +1,171 @@
+# metricas.py
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Tuple
+
+# Liga as mensagens de progresso detalhadas (por arquivo, página e download). Pode ser
+# desligado pela variável de ambiente LOG_DETALHADO=0 ou alterado em tempo de execução;
+# erros, avisos e resumos continuam sendo exibidos
+LOG_DETALHADO = os.environ.get("LOG_DETALHADO", "1") != "0"
+
+# Limites (em segundos) das faixas do histograma de duração das etapas
+FAIXAS_DURACAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Etapas medidas (rótulo "etapa" de automacao_etapa_duracao_segundos):
+#   driver_inicio, formulario_envio, download, pdf_varredura, pdf_abertura,
+#   pdf_pagina, parser, filtro, validacao, db_insercao
+NOME_HISTOGRAMA = "automacao_etapa_duracao_segundos"
+# Contadores exportados, com a descrição de cada um
+CONTADORES = {
+    "automacao_arquivos_ignorados_total": "Arquivos (ou buscas) ignorados por já terem sido baixados ou processados.",
+    "automacao_lotes_extraidos_total": "Lotes lidos dos editais pelo parser.",
+    "automacao_lotes_aprovados_total": "Lotes aprovados pelo filtro.",
+    "automacao_imoveis_gravados_total": "Imóveis gravados no banco, novos ou atualizados.",
+    "automacao_falhas_total": "Falhas em cada etapa da automação.",
+}
+
+Rotulos = Tuple[Tuple[str, str], ...]
+# Caracteres escapados nos valores dos rótulos, como pede o formato do Prometheus
+_ESCAPES_ROTULO = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+
+def log_detalhado(mensagem: str):
+    """
+    Exibe uma mensagem de progresso, só se LOG_DETALHADO estiver ligado.
+    """
+    if LOG_DETALHADO:
+        print(mensagem)
+
+
+class _Histograma:
+    def __init__(self):
+        self.contagens = [0] * (len(FAIXAS_DURACAO) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        # bisect_left: um valor igual ao limite entra na faixa "le" desse limite
+        self.contagens[bisect.bisect_left(FAIXAS_DURACAO, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    """
+    Guarda as durações das etapas e os contadores da automação, no processo atual.
+
+    As durações de cada etapa vão para um histograma (rótulo "etapa"), para que o
+    /metrics mostre tanto o tempo total quanto a distribuição (ex: páginas lentas).
+    Cada processo tem o seu registro; quem roda trabalho em outro processo devolve as
+    durações e as registra com `observar` no processo principal.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas: Dict[Rotulos, _Histograma] = {}
+        self._contadores: Dict[Tuple[str, Rotulos], float] = {}
+
+    def observar(self, etapa: str, segundos: float):
+        chave = (("etapa", etapa),)
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = _Histograma()
+            histograma.observar(segundos)
+
+    def incrementar(self, nome: str, valor: float = 1, **rotulos: str):
+        if nome not in CONTADORES:
+            raise ValueError(f"Contador desconhecido: {nome}")
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    @contextmanager
+    def medir(self, etapa: str):
+        """
+        Mede a duração do bloco como uma ocorrência da etapa. Se o bloco levantar uma
+        exceção, a duração também é registrada e a falha é contada para a etapa.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.incrementar("automacao_falhas_total", etapa=etapa)
+            raise
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def limpar(self):
+        with self._lock:
+            self._histogramas.clear()
+            self._contadores.clear()
+
+    def exportar(self) -> str:
+        """
+        Retorna as métricas no formato de texto do Prometheus.
+        """
+        with self._lock:
+            histogramas = {chave: (list(h.contagens), h.soma, h.total) for chave, h in self._histogramas.items()}
+            contadores = dict(self._contadores)
+
+        linhas = [
+            f"# HELP {NOME_HISTOGRAMA} Duração de cada etapa da automação.",
+            f"# TYPE {NOME_HISTOGRAMA} histogram",
+        ]
+        for rotulos, (contagens, soma, total) in sorted(histogramas.items()):
+            acumulado = 0
+            for limite, contagem in zip(FAIXAS_DURACAO, contagens):
+                acumulado += contagem
+                linhas.append(f"{NOME_HISTOGRAMA}_bucket{_formatar_rotulos(rotulos + (('le', str(limite)),))} {acumulado}")
+            linhas.append(f"{NOME_HISTOGRAMA}_bucket{_formatar_rotulos(rotulos + (('le', '+Inf'),))} {total}")
+            linhas.append(f"{NOME_HISTOGRAMA}_sum{_formatar_rotulos(rotulos)} {soma}")
+            linhas.append(f"{NOME_HISTOGRAMA}_count{_formatar_rotulos(rotulos)} {total}")
+
+        for nome, descricao in CONTADORES.items():
+            linhas.append(f"# HELP {nome} {descricao}")
+            linhas.append(f"# TYPE {nome} counter")
+            for (nome_contador, rotulos), valor in sorted(contadores.items()):
+                if nome_contador == nome:
+                    linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {valor:g}")
+        return "\n".join(linhas) + "\n"
+
+
+def _formatar_rotulos(rotulos: Rotulos) -> str:
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{nome}="{str(valor).translate(_ESCAPES_ROTULO)}"' for nome, valor in rotulos)
+    return "{" + pares + "}"
+
+
+class IteracaoCronometrada:
+    """
+    Repassa os itens de um iterável acumulando o tempo gasto para produzi-los. Usado para
+    separar o tempo do parser do tempo da extração quando os dois rodam intercalados.
+    """
+
+    def __init__(self, iteravel: Iterable):
+        self._iterador = iter(iteravel)
+        self.segundos = 0.0
+
+    def __iter__(self) -> Iterator:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                item = next(self._iterador)
+            except StopIteration:
+                return
+            finally:
+                self.segundos += time.perf_counter() - inicio
+            yield item
+
+
+# Registro do processo, usado por todos os módulos da automação
+registro = RegistroMetricas()
+observar = registro.observar
+incrementar = registro.incrementar
+medir = registro.medir
+exportar = registro.exportar
@@ -0,0 +1,327 @@
+# planejador_backfill.py
+
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Callable, Iterator, List, Optional, Sequence
+
+import metricas
+import processador_pdf
+import scraper_caixa
+from baixador_http import BaixadorHTTP
+from cache_extracao import calcular_hash_arquivo
+from filtro_imoveis import RegrasFiltro
+from metricas import log_detalhado
+
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+         "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+# Pasta (dentro da pasta dos editais) com o checkpoint de cada mês/estado
+PASTA_CHECKPOINTS = ".backfill"
+
+# Situações registradas no checkpoint de uma unidade (sem checkpoint, ela está pendente)
+BAIXADA = "baixada"
+PROCESSADA = "processada"
+FALHOU = "falhou"
+# A busca não mostrou editais. O site não distingue um mês vazio de uma resposta lenta,
+# então um mês encerrado só é dado como vazio depois de tantas buscas sem editais
+SEM_EDITAIS = "sem_editais"
+MAX_BUSCAS_SEM_EDITAIS = 3
+
+
+@dataclass(frozen=True, order=True)
+class UnidadeBackfill:
+    """
+    Um mês de editais de um estado: a menor parte do backfill, baixada e processada de
+    uma vez e com um checkpoint próprio.
+    """
+
+    ano: int
+    mes: int
+    estado: str
+
+    @classmethod
+    def de_mes_texto(cls, estado: str, ano: int, mes_texto: str) -> "UnidadeBackfill":
+        if mes_texto not in MESES:
+            raise ValueError(f"Mês desconhecido: {mes_texto}. Use um de: {', '.join(MESES)}.")
+        return cls(ano=int(ano), mes=MESES.index(mes_texto) + 1, estado=estado)
+
+    @property
+    def mes_texto(self) -> str:
+        return MESES[self.mes - 1]
+
+    @property
+    def nome(self) -> str:
+        return f"{self.estado}_{self.ano}_{self.mes:02d}"
+
+    def encerrada(self, hoje: Optional[date] = None) -> bool:
+        """
+        Indica se o mês já terminou. Editais de um mês em andamento ainda podem ser
+        publicados, então o download de um mês aberto nunca é dado como completo.
+        """
+        hoje = hoje or date.today()
+        return (self.ano, self.mes) < (hoje.year, hoje.month)
+
+
+def gerar_unidades(estados: Sequence[str], data_inicio: date, data_fim: Optional[date] = None) -> Iterator[UnidadeBackfill]:
+    """
+    Gera as unidades de cada estado, do mês de `data_inicio` ao de `data_fim` (por
+    padrão, o mês atual), nessa ordem.
+    """
+    data_fim = data_fim or date.today()
+    for estado in estados:
+        ano, mes = data_inicio.year, data_inicio.month
+        while (ano, mes) <= (data_fim.year, data_fim.month):
+            yield UnidadeBackfill(ano=ano, mes=mes, estado=estado)
+            mes += 1
+            if mes > 12:
+                mes = 1
+                ano += 1
+
+
+class CheckpointsBackfill:
+    """
+    Checkpoint de cada unidade em `<pasta_download>/.backfill/<UF>_<ano>_<mes>.json`:
+    situação, etapa e mensagem da última falha, arquivos baixados (nome, tamanho e
+    SHA-256) e quantos imóveis foram aprovados. Cada mudança é gravada na hora, de
+    forma atômica, para que uma execução interrompida continue de onde parou.
+    """
+
+    def __init__(self, pasta_download: str):
+        self.pasta_download = pasta_download
+        self.pasta = os.path.join(pasta_download, PASTA_CHECKPOINTS)
+        os.makedirs(self.pasta, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _caminho(self, unidade: UnidadeBackfill) -> str:
+        return os.path.join(self.pasta, f"{unidade.nome}.json")
+
+    def obter(self, unidade: UnidadeBackfill) -> dict:
+        """Retorna o checkpoint da unidade, ou um dicionário vazio se ela ainda não rodou."""
+        try:
+            with open(self._caminho(unidade), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def registrar(self, unidade: UnidadeBackfill, situacao: str, **dados) -> dict:
+        """
+        Atualiza a situação da unidade e os dados informados, mantendo os demais campos
+        do checkpoint.
+        """
+        with self._lock:
+            checkpoint = self.obter(unidade)
+            checkpoint.update(
+                estado=unidade.estado, ano=unidade.ano, mes=unidade.mes, **dados,
+                situacao=situacao, atualizado_em=datetime.now().isoformat(timespec="seconds"),
+            )
+            caminho = self._caminho(unidade)
+            caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+            with open(caminho_temporario, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+            os.replace(caminho_temporario, caminho)
+        return checkpoint
+
+    def arquivos_baixados(self, unidade: UnidadeBackfill) -> Optional[List[str]]:
+        """
+        Retorna os arquivos baixados para a unidade se o download foi completo, feito
+        depois do fim do mês, e todos continuam na pasta com o mesmo conteúdo. Caso
+        contrário, retorna None (a unidade precisa ser baixada de novo).
+        """
+        checkpoint = self.obter(unidade)
+        arquivos = checkpoint.get("arquivos")
+        if arquivos is None or not checkpoint.get("periodo_encerrado"):
+            return None
+        for arquivo in arquivos:
+            caminho = os.path.join(self.pasta_download, arquivo["nome"])
+            try:
+                if os.path.getsize(caminho) != arquivo["tamanho_bytes"] or calcular_hash_arquivo(caminho) != arquivo["sha256"]:
+                    return None
+            except OSError:
+                return None
+        return [arquivo["nome"] for arquivo in arquivos]
+
+
+def baixar_unidade(
+    unidade: UnidadeBackfill,
+    checkpoints: CheckpointsBackfill,
+    pool: Optional[scraper_caixa.PoolNavegadores] = None,
+    baixador: Optional[BaixadorHTTP] = None,
+) -> List[str]:
+    """
+    Baixa os editais da unidade, a menos que o checkpoint já tenha um download completo
+    e intacto dela, e registra os arquivos no checkpoint. Retorna os nomes dos arquivos
+    da unidade. Uma falha (inclusive um download incompleto) é registrada e levantada.
+
+    Uma busca sem editais não é uma falha: a unidade fica como SEM_EDITAIS, sem arquivos,
+    e é buscada de novo nas próximas execuções até somar MAX_BUSCAS_SEM_EDITAIS buscas
+    vazias depois do fim do mês.
+    """
+    arquivos = checkpoints.arquivos_baixados(unidade)
+    if arquivos is not None:
+        log_detalhado(f"Arquivos de {unidade.mes_texto}/{unidade.ano} de {unidade.estado} já baixados: {len(arquivos)}.")
+        metricas.incrementar("automacao_arquivos_ignorados_total", motivo="checkpoint")
+        return arquivos
+
+    try:
+        concluidos = scraper_caixa.baixar_editais_por_mes(
+            ano=unidade.ano,
+            mes_texto=unidade.mes_texto,
+            estado_sigla=unidade.estado,
+            pasta_download=checkpoints.pasta_download,
+            arquivos_existentes=[],
+            pool=pool,
+            baixador=baixador,
+            ignorar_erros=False,
+        )
+        arquivos = [
+            {
+                "nome": download.nome,
+                "tamanho_bytes": download.tamanho_bytes,
+                "sha256": download.sha256 or calcular_hash_arquivo(os.path.join(checkpoints.pasta_download, download.nome)),
+            }
+            for download in concluidos
+        ]
+    except scraper_caixa.BuscaSemResultado:
+        anterior = checkpoints.obter(unidade)
+        buscas = anterior.get("buscas_sem_editais", 0) + 1 if anterior.get("situacao") == SEM_EDITAIS else 1
+        checkpoints.registrar(
+            unidade, SEM_EDITAIS, etapa=None, erro=None, arquivos=[], buscas_sem_editais=buscas,
+            periodo_encerrado=unidade.encerrada() and buscas >= MAX_BUSCAS_SEM_EDITAIS,
+        )
+        return []
+    except Exception as e:
+        checkpoints.registrar(unidade, FALHOU, etapa="download", erro=str(e), arquivos=None)
+        raise
+    checkpoints.registrar(
+        unidade, BAIXADA, etapa=None, erro=None, arquivos=arquivos, periodo_encerrado=unidade.encerrada()
+    )
+    return [arquivo["nome"] for arquivo in arquivos]
+
+
+@dataclass
+class PlanoBackfill:
+    """
+    Grafo de tarefas do backfill. Cada unidade tem duas tarefas: o download e o
+    processamento dos seus editais, que depende só do download da mesma unidade. As
+    unidades estão separadas pelo que falta fazer, segundo os checkpoints: baixar e
+    processar, só processar (download completo e intacto) ou nada.
+    """
+
+    baixar: List[UnidadeBackfill] = field(default_factory=list)
+    processar: List[UnidadeBackfill] = field(default_factory=list)
+    concluidas: List[UnidadeBackfill] = field(default_factory=list)
+
+    def resumo(self) -> str:
+        return (
+            f"{len(self.baixar)} mês(es)/estado(s) para baixar, {len(self.processar)} já baixado(s) "
+            f"para processar e {len(self.concluidas)} concluído(s) em execuções anteriores."
+        )
+
+
+def planejar_backfill(
+    checkpoints: CheckpointsBackfill,
+    estados: Sequence[str],
+    data_inicio: date,
+    data_fim: Optional[date] = None,
+) -> PlanoBackfill:
+    """
+    Monta o plano das unidades de `estados` entre os meses de `data_inicio` e
+    `data_fim` (ver gerar_unidades), retomando o que os checkpoints já registram.
+    """
+    plano = PlanoBackfill()
+    for unidade in gerar_unidades(estados, data_inicio, data_fim):
+        if checkpoints.arquivos_baixados(unidade) is None:
+            plano.baixar.append(unidade)
+        elif checkpoints.obter(unidade).get("situacao") in (PROCESSADA, SEM_EDITAIS):
+            plano.concluidas.append(unidade)
+        else:
+            plano.processar.append(unidade)
+    return plano
+
+
+def _processar_unidade(
+    unidade: UnidadeBackfill,
+    checkpoints: CheckpointsBackfill,
+    arquivos_ja_processados: set,
+    workers: int,
+    regras: Optional[RegrasFiltro],
+    modo_extracao: str,
+) -> List[dict]:
+    # Os arquivos registrados no download (conferidos no planejamento ou baixados agora)
+    checkpoint = checkpoints.obter(unidade)
+    if checkpoint.get("situacao") == SEM_EDITAIS:
+        # Mantém a contagem de buscas vazias (ver baixar_unidade)
+        return []
+    arquivos = [arquivo["nome"] for arquivo in checkpoint.get("arquivos") or []]
+    try:
+        imoveis_aprovados = processador_pdf.processar_pdfs_e_filtrar(
+            checkpoints.pasta_download, arquivos_ja_processados, workers=workers, regras=regras, arquivos=arquivos,
+            modo_extracao=modo_extracao,
+        ) if arquivos else []
+    except Exception as e:
+        checkpoints.registrar(unidade, FALHOU, etapa="processamento", erro=str(e))
+        raise
+    checkpoints.registrar(unidade, PROCESSADA, etapa=None, erro=None, imoveis_aprovados=len(imoveis_aprovados))
+    return imoveis_aprovados
+
+
+def executar_backfill(
+    plano: PlanoBackfill,
+    checkpoints: CheckpointsBackfill,
+    pool: Optional[scraper_caixa.PoolNavegadores] = None,
+    baixador: Optional[BaixadorHTTP] = None,
+    max_downloads: int = 2,
+    workers: int = 1,
+    regras: Optional[RegrasFiltro] = None,
+    arquivos_ja_processados: Optional[set] = None,
+    ao_processar: Optional[Callable[[UnidadeBackfill, List[dict]], None]] = None,
+    modo_extracao: str = processador_pdf.MODO_TEXTO,
+) -> List[dict]:
+    """
+    Executa o plano como um pipeline: até `max_downloads` unidades (e nunca mais que o
+    tamanho do pool) são baixadas em threads, enquanto a thread atual processa os
+    editais de cada unidade assim que o download dela termina, com `workers` processos
+    e no `modo_extracao` informado (ver processador_pdf.MODOS_EXTRACAO).
+    Assim os PDFs de um mês são lidos enquanto os meses seguintes ainda são baixados.
+
+    Falhas são registradas no checkpoint da unidade e não interrompem as demais; a
+    próxima execução do mesmo plano tenta de novo só o que falhou ou não terminou.
+    `ao_processar`, se informado, recebe cada unidade com os seus imóveis aprovados
+    assim que ela é processada. Retorna todos os imóveis aprovados.
+    """
+    arquivos_ja_processados = arquivos_ja_processados or set()
+    imoveis_aprovados = []
+    if pool is not None:
+        max_downloads = min(max_downloads, pool.tamanho)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_downloads), thread_name_prefix="backfill") as executor:
+        downloads = {executor.submit(baixar_unidade, unidade, checkpoints, pool, baixador): unidade for unidade in plano.baixar}
+        prontas = list(plano.processar)
+        while prontas or downloads:
+            if not prontas:
+                concluidos, _ = wait(downloads, return_when=FIRST_COMPLETED)
+                for futuro in sorted(concluidos, key=downloads.get):
+                    unidade = downloads.pop(futuro)
+                    if futuro.exception() is not None:
+                        print(f"ERRO: Falha no download de {unidade.mes_texto}/{unidade.ano} de {unidade.estado}: {futuro.exception()}")
+                        continue
+                    prontas.append(unidade)
+                continue
+
+            unidade = prontas.pop(0)
+            log_detalhado(f"Processando os editais de {unidade.mes_texto}/{unidade.ano} de {unidade.estado}...")
+            try:
+                imoveis_unidade = _processar_unidade(
+                    unidade, checkpoints, arquivos_ja_processados, workers, regras, modo_extracao
+                )
+            except Exception as e:
+                print(f"ERRO: Falha no processamento de {unidade.mes_texto}/{unidade.ano} de {unidade.estado}: {e}")
+                metricas.incrementar("automacao_falhas_total", etapa="processamento")
+                continue
+            imoveis_aprovados.extend(imoveis_unidade)
+            if ao_processar:
+                ao_processar(unidade, imoveis_unidade)
+    return imoveis_aprovados
@@ -1,124 +1,522 @@
 # processador_pdf.py (VERSÃO CORRIGIDA E MELHORADA)
 
+import multiprocessing
 import os
 import re
+import time
 import pdfplumber
+import pypdfium2 as pdfium
+from typing import Callable, ContextManager, Iterable, Iterator, Optional
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pprint
+from cache_extracao import CacheExtracao, PASTA_CACHE
+from filtro_imoveis import LotesColunares, RegrasFiltro, limpar_valor_monetario
+import metricas
+from metricas import log_detalhado
 
-def limpar_valor_monetario(valor_str: str) -> float:
-    if not isinstance(valor_str, str):
-        return 0.0
-    valor_limpo = re.sub(r'[R$\s.]', '', valor_str).replace(',', '.')
-    try:
-        return float(valor_limpo)
-    except (ValueError, TypeError):
-        return 0.0
+# Nos editais atuais os imóveis começam na 22ª página (índice 21). As páginas com
+# imóveis são detectadas em cada edital; esta é só a faixa usada quando a detecção
+# não encontra nenhuma
+PAGINA_INICIAL_IMOVEIS = 21
+# Páginas seguidas sem valores de lote aceitas dentro de uma mesma faixa de imóveis
+MAX_LACUNA_PAGINAS = 1
+# Quantidade de páginas de um mesmo PDF entregue a cada worker no modo paralelo
+PAGINAS_POR_TAREFA = 16
+# Blocos de páginas em andamento (submetidos e não consumidos) por worker no modo paralelo
+BLOCOS_POR_WORKER = 2
+# Como os processos do pool são iniciados. O pool é criado a partir de threads (jobs da
+# API, downloads do backfill), e um fork com outras threads segurando locks pode travar
+# os workers; o forkserver inicia cada worker a partir de um processo sem threads
+INICIO_PROCESSOS = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
 
-def extrair_imoveis_do_texto(texto_completo: str, nome_arquivo: str) -> list:
-    imoveis_extraidos = []
+# Versões das regras de leitura. Incremente a versão correspondente sempre que mudar
+# a forma de extrair o texto, de interpretar os imóveis ou de aprová-los: as entradas
+# do cache gravadas com a versão antiga deixam de ser usadas a partir dessa etapa.
+VERSAO_EXTRATOR = 3
+VERSAO_PARSER = 2
+VERSAO_FILTRO = 1
+# Versão da leitura pela geometria das tabelas (ver extracao_geometria), que faz a
+# extração e a interpretação dos lotes de uma vez
+VERSAO_GEOMETRIA = 1
+
+# Formas de ler os lotes do edital: pelo texto de cada página ("texto") ou pela posição
+# do texto nas colunas da tabela ("geometria", ver extracao_geometria)
+MODO_TEXTO = "texto"
+MODO_GEOMETRIA = "geometria"
+MODOS_EXTRACAO = (MODO_TEXTO, MODO_GEOMETRIA)
+
+# Padrões usados pelo parser, que trabalha linha a linha.
+# Cabeçalhos de estado e cidade (alguns editais vêm inteiros em maiúsculas)
+PADRAO_ESTADO = re.compile(r"Estado:\s*(\w{2})", re.IGNORECASE)
+PADRAO_CIDADE = re.compile(r"Cidade:\s*([^\n]+)", re.IGNORECASE)
+# Primeira linha de um lote: número do item, texto descritivo e os três valores no final
+# (Valor 1º Leilão, Valor 2º Leilão, Valor Avaliação). As demais linhas da descrição
+# vêm em seguida e podem continuar na página seguinte.
+PADRAO_VALOR = r"(\d[\d.]*,\d{2})"
+PADRAO_LINHA_LOTE = re.compile(rf"^\s*(\d+)\s+(.*?)\s*{PADRAO_VALOR}\s+{PADRAO_VALOR}\s+{PADRAO_VALOR}\s*$")
+# Os três valores de um lote em qualquer ponto do texto (a pré-varredura não depende
+# da ordem das linhas, que muda conforme a biblioteca que extrai o texto)
+PADRAO_VALORES_LOTE = re.compile(rf"{PADRAO_VALOR}\s+{PADRAO_VALOR}\s+{PADRAO_VALOR}")
+PADRAO_MATRICULA = re.compile(r"Matr[ií]cula:\s*(\w+)", re.IGNORECASE)
+# Limite de texto acumulado por lote enquanto a matrícula não aparece
+MAX_CARACTERES_CONTINUACAO = 2000
+
+
+def iterar_imoveis_das_paginas(paginas: Iterable[str], nome_arquivo: str) -> Iterator[dict]:
+    """
+    Gera os imóveis do edital à medida que as páginas são lidas.
+
+    O estado, a cidade e o lote em aberto são mantidos de uma página para a outra,
+    então um lote cuja descrição (e matrícula) continua na página seguinte é montado
+    corretamente. Só o lote corrente fica em memória, qualquer que seja o tamanho do PDF.
+    """
     estado_atual, cidade_atual = "", ""
-    
-    # Novo padrão para capturar a Matrícula
-    padrao_matricula = re.compile(r"Matricula:\s*(\w+)\s*")
-    
-    # Padrão para encontrar um bloco de imóvel:
-    # Começa com um número no início da linha, seguido por texto e pelos valores de leilão.
-    # Esta regex captura o número do item, todo o texto descritivo, e os três valores no final.
-    padrao_bloco = re.compile(
-        r"^\s*(\d+)\s+(.*?)"  # 1: Número do item, 2: Todo o texto de descrição
-        r"([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s*$",  # 3, 4, 5: Valor 1º Leilão, Valor 2º Leilão, Valor Avaliação
-        re.MULTILINE | re.DOTALL # MULTILINE para ^ funcionar em cada linha, DOTALL para . capturar quebras de linha
-    )
+    imovel_pendente, continuacao = None, ""
+
+    for texto_pagina in paginas:
+        if not texto_pagina:
+            continue
+
+        for linha in texto_pagina.splitlines():
+            estado_match = PADRAO_ESTADO.search(linha)
+            cidade_match = PADRAO_CIDADE.search(linha)
+            lote_match = PADRAO_LINHA_LOTE.match(linha)
 
-    for trecho in texto_completo.split("Estado:")[1:]:
-        estado_match = re.search(r"(\w{2})", trecho)
-        if estado_match:
-            estado_atual = estado_match.group(1).strip()
+            if estado_match or cidade_match or lote_match:
+                # Um novo cabeçalho ou lote encerra o lote em aberto
+                if imovel_pendente:
+                    yield imovel_pendente
+                imovel_pendente, continuacao = None, ""
 
-        for sub_trecho in trecho.split("Cidade:")[1:]:
-            cidade_match = re.search(r"([^\n]+)", sub_trecho)
+            if estado_match:
+                # Lotes só são considerados depois da cidade do novo estado
+                estado_atual, cidade_atual = estado_match.group(1).strip(), ""
             if cidade_match:
                 cidade_atual = cidade_match.group(1).strip()
-            
-            for match in padrao_bloco.finditer(sub_trecho):
-                id_lote_str, descricao, valor1_str, valor2_str, _ = match.groups()
-                
-                # Encontra a matrícula no texto da descrição
-                matricula_match = padrao_matricula.search(descricao)
-                matricula = matricula_match.group(1).strip() if matricula_match else None
-                
-                imovel = {
+
+            if lote_match and estado_atual and cidade_atual:
+                id_lote_str, descricao, valor1_str, valor2_str, _ = lote_match.groups()
+                imovel_pendente = {
                     "id_lote": int(id_lote_str),
                     "estado": estado_atual,
                     "cidade": cidade_atual,
-                    "endereco": ' '.join(descricao.replace('\n', ' ').split()),
-                    "matricula": matricula, # Adicionamos o campo de matrícula
+                    "endereco": ' '.join(descricao.split()),
+                    "matricula": None,
                     "valor1_str": valor1_str,
                     "valor2_str": valor2_str,
                     "origem_edital": nome_arquivo
                 }
-                imoveis_extraidos.append(imovel)
+            elif imovel_pendente and not (estado_match or cidade_match):
+                # Linha de continuação da descrição: só interessa até achar a matrícula
+                continuacao = f"{continuacao} {linha}"[-MAX_CARACTERES_CONTINUACAO:]
+                matricula_match = PADRAO_MATRICULA.search(continuacao)
+                # Se "Matrícula:" terminou a linha, o número ainda está por vir
+                if matricula_match and matricula_match.end() < len(continuacao):
+                    imovel_pendente["matricula"] = matricula_match.group(1)
+                    yield imovel_pendente
+                    imovel_pendente, continuacao = None, ""
+
+    if imovel_pendente:
+        yield imovel_pendente
+
+
+def extrair_imoveis_do_texto(texto_completo: str, nome_arquivo: str) -> list:
+    return list(iterar_imoveis_das_paginas([texto_completo], nome_arquivo))
+
+
+def filtrar_imoveis(imoveis_brutos: list, regras: Optional[RegrasFiltro] = None) -> list[dict]:
+    """
+    Aplica as regras de aprovação (por padrão, provisão mínima de R$ 5.000,00) sobre
+    os imóveis extraídos de um edital. Os valores são lidos e as regras avaliadas de
+    uma vez para todos os lotes (ver filtro_imoveis.LotesColunares).
+    """
+    return LotesColunares(imoveis_brutos).filtrar(regras or RegrasFiltro())
+
+
+def detectar_paginas_imoveis(caminho_completo: str) -> list[tuple[int, int]]:
+    """
+    Pré-varredura rápida do PDF: retorna as faixas de páginas [inicio, fim) que contêm
+    as tabelas de imóveis, para que só elas passem pela extração do pdfplumber.
+
+    O texto de cada página é lido com o pdfium (sem montar o layout), e uma página entra
+    na faixa se tiver um cabeçalho "Estado:"/"Cidade:" ou os valores de um lote, a partir
+    do primeiro "Estado:" do edital. Lacunas de até MAX_LACUNA_PAGINAS páginas não
+    quebram a faixa, para não perder a continuação de um lote.
+    """
+    paginas_com_imoveis = []
+    pdf = pdfium.PdfDocument(caminho_completo)
+    try:
+        num_paginas = len(pdf)
+        encontrou_estado = False
+        for indice in range(num_paginas):
+            pagina = pdf[indice]
+            texto_pagina = pagina.get_textpage()
+            texto = texto_pagina.get_text_bounded()
+            texto_pagina.close()
+            pagina.close()
+
+            tem_estado = PADRAO_ESTADO.search(texto) is not None
+            encontrou_estado = encontrou_estado or tem_estado
+            if encontrou_estado and (tem_estado or PADRAO_CIDADE.search(texto) or PADRAO_VALORES_LOTE.search(texto)):
+                paginas_com_imoveis.append(indice)
+    finally:
+        pdf.close()
+
+    if not paginas_com_imoveis:
+        return [(min(PAGINA_INICIAL_IMOVEIS, num_paginas), num_paginas)]
+
+    faixas = []
+    for indice in paginas_com_imoveis:
+        if faixas and indice - faixas[-1][1] <= MAX_LACUNA_PAGINAS:
+            faixas[-1][1] = indice + 1
+        else:
+            faixas.append([indice, indice + 1])
+    return [(inicio, fim) for inicio, fim in faixas]
+
+
+def _detectar_paginas_cronometrado(caminho_completo: str) -> tuple[list[tuple[int, int]], float]:
+    """
+    detectar_paginas_imoveis para os processos do pool: devolve também a duração,
+    que é registrada nas métricas do processo principal.
+    """
+    inicio = time.perf_counter()
+    faixas = detectar_paginas_imoveis(caminho_completo)
+    return faixas, time.perf_counter() - inicio
+
+
+def _extrair_textos_paginas(caminho_completo: str, inicio: int, fim: int) -> tuple[list[str], list[tuple[str, float]]]:
+    """
+    Extrai o texto das páginas [inicio, fim) de um PDF. Executada nos processos
+    do pool, por isso recebe apenas o caminho e abre o arquivo por conta própria.
+    Devolve os textos e as durações medidas (etapa, segundos), que são registradas
+    nas métricas do processo principal.
+    """
+    duracoes = []
+    observar = lambda etapa, segundos: duracoes.append((etapa, segundos))
+    textos = list(_iterar_paginas_pdf(caminho_completo, inicio, fim, observar=observar))
+    return textos, duracoes
+
+
+def _iterar_paginas_pdf(
+    caminho_completo: str,
+    inicio: int = PAGINA_INICIAL_IMOVEIS,
+    fim: Optional[int] = None,
+    observar: Callable[[str, float], None] = metricas.observar,
+) -> Iterator[str]:
+    """
+    Gera o texto de cada página, liberando os objetos de layout da página assim
+    que o texto é lido para que a memória não cresça com o tamanho do PDF.
 
-    return imoveis_extraidos
+    A abertura do arquivo e a extração de cada página são medidas com `observar`
+    (etapas "pdf_abertura" e "pdf_pagina").
+    """
+    inicio_abertura = time.perf_counter()
+    with pdfplumber.open(caminho_completo) as pdf:
+        paginas = pdf.pages[inicio:fim]
+        observar("pdf_abertura", time.perf_counter() - inicio_abertura)
+        for page in paginas:
+            inicio_pagina = time.perf_counter()
+            texto = page.extract_text() or ""
+            page.close()
+            observar("pdf_pagina", time.perf_counter() - inicio_pagina)
+            yield texto
 
 
-def processar_pdfs_e_filtrar(pasta_pdfs: str, arquivos_ja_processados: set) -> list[dict]:
+def _iterar_faixas_pdf(caminho_completo: str, faixas: Iterable[tuple[int, int]]) -> Iterator[str]:
+    for inicio, fim in faixas:
+        yield from _iterar_paginas_pdf(caminho_completo, inicio, fim)
+
+
+def _extrair_imoveis_geometria(caminho_completo: str) -> tuple[list[tuple[int, int]], list[dict]]:
+    """
+    Lê os lotes do edital pela geometria das tabelas, no mesmo formato dos imóveis do
+    parser de texto. Retorna também as faixas de páginas detectadas. Executada nos
+    processos do pool no modo paralelo.
+    """
+    # Importado aqui porque extracao_geometria depende deste módulo
+    from extracao_geometria import iterar_lotes_geometria
+
+    faixas = detectar_paginas_imoveis(caminho_completo)
+    return faixas, [lote.como_imovel_bruto() for lote in iterar_lotes_geometria(caminho_completo, faixas)]
+
+
+class _ExtracaoParalela:
+    """
+    Distribui a pré-varredura e a extração de texto entre os processos do pool. As
+    faixas com imóveis de cada PDF são divididas em blocos de `paginas_por_tarefa`
+    páginas, de modo que um edital grande também é lido por vários workers ao mesmo tempo.
+
+    Os blocos são consumidos na ordem dos arquivos e, dentro de cada arquivo, na ordem
+    das páginas. No máximo `max_blocos` ficam submetidos e ainda não consumidos: o
+    próximo só é submetido quando um é entregue ao parser, então o texto em memória
+    não cresce com a quantidade de editais.
+    """
+
+    def __init__(self, executor: ProcessPoolExecutor, caminhos: dict[str, str], paginas_por_tarefa: int, max_blocos: int):
+        self.executor = executor
+        self.max_blocos = max_blocos
+        # Para cada arquivo, as faixas detectadas ou a exceção que impediu a leitura dele
+        self.faixas = {}
+        self._ordem = {nome: indice for indice, nome in enumerate(caminhos)}
+        self._a_submeter = deque()
+        self._submetidos = deque()
+
+        futuros_faixas = {nome: executor.submit(_detectar_paginas_cronometrado, caminho) for nome, caminho in caminhos.items()}
+        for nome, futuro in futuros_faixas.items():
+            try:
+                faixas, segundos = futuro.result()
+            except Exception as e:
+                metricas.incrementar("automacao_falhas_total", etapa="pdf_varredura")
+                self.faixas[nome] = e
+                continue
+            metricas.observar("pdf_varredura", segundos)
+            self.faixas[nome] = faixas
+            self._a_submeter.extend(
+                (nome, (caminhos[nome], inicio, min(inicio + paginas_por_tarefa, fim)))
+                for inicio_faixa, fim in faixas
+                for inicio in range(inicio_faixa, fim, paginas_por_tarefa)
+            )
+        self._completar()
+
+    def _completar(self):
+        while len(self._submetidos) < self.max_blocos and self._a_submeter:
+            nome, argumentos = self._a_submeter.popleft()
+            self._submetidos.append((nome, self.executor.submit(_extrair_textos_paginas, *argumentos)))
+
+    def _descartar(self, manter: Callable[[str], bool]):
+        # Remove do início das filas os blocos de arquivos que não serão mais lidos
+        while self._submetidos and not manter(self._submetidos[0][0]):
+            self._submetidos.popleft()[1].cancel()
+        while self._a_submeter and not manter(self._a_submeter[0][0]):
+            self._a_submeter.popleft()
+
+    def paginas(self, nome: str) -> Iterator[str]:
+        """
+        Gera o texto das páginas do arquivo na ordem original, à medida que os blocos
+        ficam prontos. O resultado de cada bloco é liberado assim que é repassado.
+        """
+        # Blocos de arquivos anteriores que não chegaram a ser lidos (ex: por uma falha)
+        self._descartar(lambda outro: self._ordem[outro] >= self._ordem[nome])
+        self._completar()
+        try:
+            while self._submetidos and self._submetidos[0][0] == nome:
+                _, futuro = self._submetidos.popleft()
+                textos, duracoes = futuro.result()
+                del futuro
+                self._completar()
+                for etapa, segundos in duracoes:
+                    metricas.observar(etapa, segundos)
+                yield from textos
+                del textos
+        finally:
+            # Se um bloco falhou, os seguintes do mesmo arquivo não precisam mais ser lidos
+            self._descartar(lambda outro: outro != nome)
+            self._completar()
+
+
+def processar_pdfs_e_filtrar(
+    pasta_pdfs: str,
+    arquivos_ja_processados: set,
+    workers: int = 1,
+    paginas_por_tarefa: int = PAGINAS_POR_TAREFA,
+    usar_cache: bool = True,
+    medir_etapa: Optional[Callable[[str], ContextManager]] = None,
+    regras: Optional[RegrasFiltro] = None,
+    arquivos: Optional[Iterable[str]] = None,
+    modo_extracao: str = MODO_TEXTO,
+) -> list[dict]:
+    """
+    Lê os editais da pasta e retorna os imóveis aprovados, na ordem alfabética dos arquivos.
+    Com `arquivos`, só esses arquivos da pasta são lidos (ex: os de um mês, ver planejador_backfill).
+
+    O texto de cada página é consumido pelo parser assim que é lido, sem montar o texto
+    completo do edital em memória. Com `workers` > 1 a extração de texto é feita em um
+    pool de processos; o resultado é o mesmo do modo sequencial. Uma falha em um arquivo
+    não interrompe os demais.
+
+    Só as páginas com tabelas de imóveis (ver detectar_paginas_imoveis) são extraídas;
+    as faixas detectadas ficam registradas na entrada do cache de cada edital.
+
+    Com `usar_cache`, o texto das páginas e os imóveis extraídos de cada PDF ficam
+    guardados em `<pasta_pdfs>/.cache_extracao`, indexados pelo hash do arquivo. Um PDF
+    já visto (inclusive os sem imóveis aprovados ou que falharam) não é lido de novo
+    enquanto as versões VERSAO_EXTRATOR/VERSAO_PARSER/VERSAO_FILTRO não mudarem.
+    Os imóveis aprovados ficam no cache junto com as `regras` de filtro usadas; com
+    outras regras, os imóveis extraídos são apenas filtrados de novo.
+
+    `modo_extracao` escolhe como os lotes são lidos (ver MODOS_EXTRACAO). No modo
+    "geometria" os lotes vêm de extracao_geometria.iterar_lotes_geometria e passam
+    pelo mesmo filtro; o modo faz parte da versão das entradas do cache, então trocar
+    de modo faz os editais serem lidos de novo.
+
+    `medir_etapa`, se informado, é chamado como gerenciador de contexto em volta das
+    etapas "extracao" e "filtro" de cada arquivo (usado para acompanhar o progresso).
+    """
+    if modo_extracao not in MODOS_EXTRACAO:
+        raise ValueError(f"Modo de extração desconhecido: {modo_extracao}")
+    # Na geometria não há texto de página guardado: extração e parser têm a mesma versão
+    versao_extrator, versao_parser = (
+        (VERSAO_EXTRATOR, VERSAO_PARSER) if modo_extracao == MODO_TEXTO else (VERSAO_GEOMETRIA, VERSAO_GEOMETRIA)
+    )
+    medir_etapa = medir_etapa or (lambda etapa: nullcontext())
+    regras = regras or RegrasFiltro()
+    assinatura_regras = regras.assinatura()
     imoveis_aprovados = []
     if not os.path.isdir(pasta_pdfs):
         print(f"Erro: A pasta '{pasta_pdfs}' não foi encontrada.")
         return []
 
     print(f"\n>>> Iniciando processamento de PDFs na pasta '{pasta_pdfs}'...")
-    for nome_arquivo in os.listdir(pasta_pdfs):
+    cache = CacheExtracao(os.path.join(pasta_pdfs, PASTA_CACHE)) if usar_cache else None
+
+    caminhos = {}
+    for nome_arquivo in sorted(os.listdir(pasta_pdfs) if arquivos is None else set(arquivos)):
         # Ignora arquivos que já foram processados
         if nome_arquivo in arquivos_ja_processados:
-            print(f"  - Ignorando arquivo já processado: {nome_arquivo}")
+            log_detalhado(f"  - Ignorando arquivo já processado: {nome_arquivo}")
+            metricas.incrementar("automacao_arquivos_ignorados_total", motivo="ja_processado")
             continue
 
         if nome_arquivo.lower().endswith(".pdf"):
-            caminho_completo = os.path.join(pasta_pdfs, nome_arquivo)
-            print(f"  - Lendo arquivo: {nome_arquivo}")
+            caminhos[nome_arquivo] = os.path.join(pasta_pdfs, nome_arquivo)
+
+    entradas = {}
+    for nome_arquivo, caminho_completo in caminhos.items():
+        try:
+            entradas[nome_arquivo] = cache.obter(caminho_completo) if cache else {}
+        except OSError as e:
+            print(f"    ERRO: Falha ao ler o arquivo {nome_arquivo}. Erro: {e}")
+
+    # Só são abertos os arquivos sem texto em cache, lidos em outro modo, com texto de
+    # outra versão do extrator ou cuja falha registrada foi produzida por outra versão do parser
+    # (as entradas anteriores ao modo de extração foram todas lidas do texto)
+    pendentes = {
+        nome_arquivo: caminhos[nome_arquivo]
+        for nome_arquivo, entrada in entradas.items()
+        if entrada.get("modo_extracao", MODO_TEXTO) != modo_extracao
+        or entrada.get("versao_extrator") != versao_extrator
+        or (entrada.get("erro") and entrada.get("versao_parser") != versao_parser)
+    }
+
+    with (
+        ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(INICIO_PROCESSOS))
+        if workers > 1 and pendentes
+        else nullcontext()
+    ) as executor:
+        extracao = None
+        futuros_geometria = {}
+        if executor:
+            print(f"  Extraindo texto de {len(pendentes)} arquivo(s) com {workers} processos...")
+            if modo_extracao == MODO_GEOMETRIA:
+                # Cada worker lê um edital inteiro; o resultado já são os lotes, e não o texto
+                futuros_geometria = {
+                    nome_arquivo: executor.submit(_extrair_imoveis_geometria, caminho)
+                    for nome_arquivo, caminho in pendentes.items()
+                }
+            else:
+                extracao = _ExtracaoParalela(executor, pendentes, paginas_por_tarefa, BLOCOS_POR_WORKER * workers)
+
+        for nome_arquivo, entrada in entradas.items():
+            log_detalhado(f"  - Lendo arquivo: {nome_arquivo}")
+            entrada_alterada = False
 
             try:
-                with pdfplumber.open(caminho_completo) as pdf:
-                    print(f"    PDF aberto com {len(pdf.pages)} páginas")
-                    texto_completo = ""
-                    # Começa a extrair o texto de onde os imóveis começam a ser listados
-                    for page_num, page in enumerate(pdf.pages[21:], 21): 
-                        texto_pagina = page.extract_text()
-                        if texto_pagina:
-                            texto_completo += texto_pagina + "\n"
-                    
-                    print(f"    Texto extraído: {len(texto_completo)} caracteres")
-                    if len(texto_completo) > 0:
-                        print(f"    Primeiros 200 chars: {repr(texto_completo[:200])}")
-                
-                imoveis_brutos = extrair_imoveis_do_texto(texto_completo, nome_arquivo)
-                print(f"    Imóveis extraídos: {len(imoveis_brutos)}")
-
-                for imovel_data in imoveis_brutos:
-                    valor1 = limpar_valor_monetario(imovel_data["valor1_str"])
-                    valor2 = limpar_valor_monetario(imovel_data["valor2_str"])
-
-                    if valor1 > 0 and valor2 > 0:
-                        provisao = valor1 - valor2
-                        
-                        if provisao >= 5000:
-                            imovel_aprovado = {
-                                "id_lote": imovel_data["id_lote"],
-                                "estado": imovel_data["estado"],
-                                "cidade": imovel_data["cidade"],
-                                "endereco": imovel_data["endereco"], # Corrigido: usar 'endereco' em vez de 'descricao_completa'
-                                "matricula": imovel_data["matricula"], # Adicionamos a matricula ao objeto
-                                "valor_1_leilao": valor1,
-                                "valor_2_leilao": valor2,
-                                "provisao": round(provisao, 2),
-                                "origem_edital": imovel_data["origem_edital"]
-                            }
-                            imoveis_aprovados.append(imovel_aprovado)
+                ler_pdf = nome_arquivo in pendentes
+                if not ler_pdf and not entrada["erro"] and entrada.get("versao_parser") != versao_parser:
+                    log_detalhado("    Usando texto em cache")
+                    try:
+                        with medir_etapa("extracao"), metricas.medir("parser"):
+                            imoveis_brutos = list(iterar_imoveis_das_paginas(cache.ler_paginas(entrada["sha256"]), nome_arquivo))
+                    except (OSError, EOFError, ValueError) as e:
+                        # O texto guardado sumiu ou está corrompido: o edital é lido de novo do PDF
+                        log_detalhado(f"    Texto em cache ilegível ({e}), lendo o PDF")
+                        ler_pdf = True
+                    else:
+                        entrada_alterada = True
+                        entrada.update(versao_parser=versao_parser, imoveis_brutos=imoveis_brutos)
+                        metricas.incrementar("automacao_lotes_extraidos_total", len(imoveis_brutos))
+                        entrada.pop("versao_filtro", None)
+
+                if ler_pdf:
+                    entrada_alterada = True
+                    try:
+                        with medir_etapa("extracao"):
+                            if modo_extracao == MODO_GEOMETRIA:
+                                with metricas.medir("parser"):
+                                    faixas, imoveis_brutos = (
+                                        futuros_geometria.pop(nome_arquivo).result() if nome_arquivo in futuros_geometria
+                                        else _extrair_imoveis_geometria(caminhos[nome_arquivo])
+                                    )
+                                entrada["paginas_imoveis"] = faixas
+                            else:
+                                # Um arquivo fora da extração paralela (ex: texto em cache ilegível) é lido aqui
+                                if extracao and nome_arquivo in extracao.faixas:
+                                    faixas = extracao.faixas[nome_arquivo]
+                                    if isinstance(faixas, Exception):
+                                        raise faixas
+                                    paginas = extracao.paginas(nome_arquivo)
+                                else:
+                                    with metricas.medir("pdf_varredura"):
+                                        faixas = detectar_paginas_imoveis(caminhos[nome_arquivo])
+                                    paginas = _iterar_faixas_pdf(caminhos[nome_arquivo], faixas)
+                                entrada["paginas_imoveis"] = faixas
+                                if cache:
+                                    paginas = cache.gravar_paginas(entrada["sha256"], paginas)
+                                # O parser consome as páginas à medida que são extraídas; o tempo
+                                # gasto produzindo as páginas é descontado do tempo do parser
+                                paginas = metricas.IteracaoCronometrada(paginas)
+                                inicio_parser = time.perf_counter()
+                                imoveis_brutos = list(iterar_imoveis_das_paginas(paginas, nome_arquivo))
+                                metricas.observar("parser", time.perf_counter() - inicio_parser - paginas.segundos)
+                            log_detalhado(f"    Páginas com imóveis: {', '.join(f'{inicio + 1}-{fim}' for inicio, fim in faixas)}")
+                            metricas.incrementar("automacao_lotes_extraidos_total", len(imoveis_brutos))
+                    except OSError:
+                        # Falhas de E/S (ex: ao gravar o cache) não dizem nada sobre o edital: nada é
+                        # registrado e o arquivo é lido de novo na próxima execução
+                        entrada_alterada = False
+                        raise
+                    except Exception as e:
+                        # A falha do parser também fica registrada, para o mesmo arquivo não ser
+                        # reprocessado a cada execução
+                        entrada.update(
+                            modo_extracao=modo_extracao, versao_extrator=versao_extrator, versao_parser=versao_parser, erro=str(e)
+                        )
+                        raise
+                    entrada.update(modo_extracao=modo_extracao, versao_extrator=versao_extrator, versao_parser=versao_parser, erro=None)
+                    entrada.update(imoveis_brutos=imoveis_brutos)
+                    entrada.pop("versao_filtro", None)
+                elif entrada["erro"]:
+                    raise RuntimeError(entrada["erro"])
+                elif not entrada_alterada:
+                    log_detalhado("    Usando imóveis em cache")
+                log_detalhado(f"    Imóveis extraídos: {len(entrada['imoveis_brutos'])}")
+
+                if entrada.get("versao_filtro") != VERSAO_FILTRO or entrada.get("regras_filtro") != assinatura_regras:
+                    with medir_etapa("filtro"), metricas.medir("filtro"):
+                        entrada.update(
+                            versao_filtro=VERSAO_FILTRO,
+                            regras_filtro=assinatura_regras,
+                            imoveis_aprovados=filtrar_imoveis(entrada["imoveis_brutos"], regras),
+                        )
+                    metricas.incrementar("automacao_lotes_aprovados_total", len(entrada["imoveis_aprovados"]))
+                    entrada_alterada = True
+
+                # O mesmo conteúdo pode ter chegado com outro nome de arquivo
+                imoveis_aprovados.extend(
+                    dict(imovel, origem_edital=nome_arquivo) for imovel in entrada["imoveis_aprovados"]
+                )
             except Exception as e:
                 print(f"    ERRO: Falha ao processar o arquivo {nome_arquivo}. Erro: {e}")
-    
+                metricas.incrementar("automacao_falhas_total", etapa="processamento")
+            finally:
+                if cache and entrada_alterada:
+                    try:
+                        cache.salvar(entrada)
+                    except OSError as e:
+                        print(f"    AVISO: Falha ao gravar o cache do arquivo {nome_arquivo}. Erro: {e}")
+
     print(f">>> Processamento finalizado. {len(imoveis_aprovados)} imóveis aprovados.")
     return imoveis_aprovados
 
@@ -130,7 +528,7 @@ if __name__ == "__main__":
         os.makedirs(PASTA_DOS_EDITAIS)
         print(f"Pasta '{PASTA_DOS_EDITAIS}' criada para teste. Por favor, adicione seu PDF nela.")
 
-    imoveis_encontrados = processar_pdfs_e_filtrar(PASTA_DOS_EDITAIS, set())
+    imoveis_encontrados = processar_pdfs_e_filtrar(PASTA_DOS_EDITAIS, set(), workers=os.cpu_count() or 1)
     
     if imoveis_encontrados:
         print("\n--- IMÓVEIS APROVADOS ENCONTRADOS ---")
@@ -0,0 +1,159 @@
+# rastreador_downloads.py
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Sufixos dos arquivos que o navegador ainda está escrevendo
+SUFIXOS_EM_ANDAMENTO = (".crdownload", ".part", ".tmp")
+# Intervalo de verificação da pasta quando o inotify não está disponível
+INTERVALO_VERIFICACAO = 0.25
+
+# Eventos do inotify que indicam mudança nos arquivos da pasta
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+
+
+@dataclass
+class DownloadConcluido:
+    nome: str
+    tamanho_bytes: int
+    duracao_segundos: float
+    sha256: Optional[str] = None
+
+
+def _abrir_inotify(pasta: str) -> Optional[int]:
+    """
+    Abre um descritor inotify observando a pasta. Retorna None fora do Linux ou se a
+    chamada falhar; nesse caso o rastreador verifica a pasta periodicamente.
+    """
+    nome_libc = ctypes.util.find_library("c")
+    if not nome_libc:
+        return None
+    try:
+        libc = ctypes.CDLL(nome_libc, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(pasta), _IN_CREATE | _IN_MOVED_TO | _IN_CLOSE_WRITE) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class RastreadorDownloads:
+    """
+    Acompanha os downloads feitos pelo navegador em uma pasta.
+
+    A pasta é observada com inotify (no Linux) e, a cada mudança, é relida para saber
+    quais downloads começaram (arquivos .crdownload) e quais terminaram (arquivo final
+    presente). Os arquivos que já estavam na pasta ao criar o rastreador são ignorados.
+
+    Uso:
+        with RastreadorDownloads(pasta) as rastreador:
+            rastreador.registrar_pedido()   # logo antes de clicar no link
+            link.click()
+            ...
+            concluidos = rastreador.aguardar_conclusao(quantidade=3, timeout=120)
+    """
+
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+        self._existentes = set(os.listdir(pasta))
+        self._inicio = time.monotonic()
+        self._pedidos = deque()
+        self._vistos_em_andamento: Dict[str, float] = {}
+        self._em_andamento = set()
+        self._concluidos: Dict[str, DownloadConcluido] = {}
+        self._fd = _abrir_inotify(pasta)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fechar()
+
+    def fechar(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def concluidos(self) -> List[DownloadConcluido]:
+        return list(self._concluidos.values())
+
+    def registrar_pedido(self):
+        """
+        Anota o momento em que um download foi pedido, usado para medir sua duração.
+        """
+        self._pedidos.append(time.monotonic())
+
+    def _verificar_pasta(self):
+        agora = time.monotonic()
+        em_andamento = set()
+        for nome in os.listdir(self.pasta):
+            if nome in self._existentes or nome in self._concluidos:
+                continue
+            if nome.endswith(SUFIXOS_EM_ANDAMENTO):
+                em_andamento.add(nome)
+                self._vistos_em_andamento.setdefault(os.path.splitext(nome)[0], agora)
+                continue
+            try:
+                tamanho = os.path.getsize(os.path.join(self.pasta, nome))
+            except OSError:
+                continue  # renomeado ou removido durante a leitura
+            inicio = self._vistos_em_andamento.pop(nome, None)
+            if self._pedidos:
+                inicio = min(inicio or agora, self._pedidos.popleft())
+            self._concluidos[nome] = DownloadConcluido(
+                nome=nome,
+                tamanho_bytes=tamanho,
+                duracao_segundos=round(agora - (inicio or self._inicio), 3),
+            )
+        self._em_andamento = em_andamento
+
+    def _esperar_mudanca(self, timeout: float):
+        if self._fd is None:
+            time.sleep(min(timeout, INTERVALO_VERIFICACAO))
+            return
+        prontos, _, _ = select.select([self._fd], [], [], timeout)
+        if prontos:
+            # O conteúdo dos eventos não importa: a pasta é relida em seguida
+            try:
+                while os.read(self._fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def _aguardar(self, condicao, timeout: float) -> bool:
+        limite = time.monotonic() + timeout
+        while True:
+            self._verificar_pasta()
+            if condicao():
+                return True
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return False
+            self._esperar_mudanca(restante)
+
+    def aguardar_inicio(self, quantidade: int, timeout: float) -> bool:
+        """
+        Espera até que `quantidade` downloads tenham começado (ou terminado).
+        """
+        return self._aguardar(lambda: len(self._em_andamento) + len(self._concluidos) >= quantidade, timeout)
+
+    def aguardar_conclusao(self, quantidade: int, timeout: float) -> List[DownloadConcluido]:
+        """
+        Espera até que `quantidade` downloads tenham terminado, retornando assim que o
+        último chega, e devolve os downloads concluídos (mesmo se o tempo acabar antes).
+        """
+        self._aguardar(lambda: len(self._concluidos) >= quantidade and not self._em_andamento, timeout)
+        return self.concluidos
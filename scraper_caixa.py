@@ -1,7 +1,12 @@
 # scraper_caixa.py (VERSÃO CORRIGIDA PARA BAIXAR MÚLTIPLOS EDITAIS)
 
 import os
-import time
+import queue
+import shutil
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
@@ -9,117 +14,357 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select, WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from baixador_http import BaixadorHTTP, extrair_links_editais
+from rastreador_downloads import DownloadConcluido, RastreadorDownloads
+import metricas
+from metricas import log_detalhado
 
 # --- Configurações ---
 URL = "https://venda-imoveis.caixa.gov.br/sistema/busca-documentos.asp"
+TIPO_DOCUMENTO = "Edital de Publicação do Leilão SFI - Edital Único"
+TEXTO_LINK_EDITAL = "Edital de Publicação do Leilão SFI"
+# Pasta (dentro da pasta de download) com os downloads HTTP ainda não concluídos
+PASTA_PARCIAIS_HTTP = ".parciais_http"
+# Tempo máximo para um download começar depois do clique no link do edital
+TIMEOUT_INICIO_DOWNLOAD = 30
+# Tempo máximo para todos os downloads de uma busca terminarem
+TIMEOUT_DOWNLOADS = 120
 
-def baixar_editais_por_mes(ano: int, mes_texto: str, estado_sigla: str, pasta_download: str, arquivos_existentes: list):
+
+class DownloadIncompleto(Exception):
+    """Nem todos os editais encontrados na busca foram baixados."""
+
+
+class BuscaSemResultado(Exception):
     """
-    Navega no site da Caixa, preenche o formulário e baixa TODOS os editais de um
-    determinado mês, ano e estado.
+    A busca não mostrou nenhum edital no tempo de espera. O site não distingue um mês
+    sem editais de uma resposta lenta, então o período não é dado como baixado.
     """
-    # Garante que a pasta de download existe
-    if not os.path.exists(pasta_download):
-        os.makedirs(pasta_download)
 
-    # Verifica se já existem arquivos baixados para esse período antes de iniciar
-    # Esta verificação foi simplificada para evitar downloads repetidos se o script for executado várias vezes
-    # No entanto, a lógica original que verifica nomes específicos também é válida.
-    # Para o propósito de baixar múltiplos arquivos, esta verificação é mais segura.
-    arquivos_periodo = [f for f in arquivos_existentes if f"{estado_sigla}_{mes_texto}_{ano}" in f or f"EL" in f]
-    if any(f for f in os.listdir(pasta_download) if f"{estado_sigla}_{mes_texto}_{ano}" in f or f"EL" in f):
-        print(f"Arquivos para {mes_texto}/{ano} de {estado_sigla} já parecem ter sido baixados. Ignorando download.")
-        return
 
+@lru_cache(maxsize=1)
+def caminho_chromedriver() -> str:
+    """
+    Resolve (e baixa, se preciso) o chromedriver uma única vez por processo.
+    """
+    return ChromeDriverManager().install()
+
+
+def _criar_driver(headless: bool = True) -> webdriver.Chrome:
     # Configura as opções do Chrome para fazer download automático
     chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_experimental_option("prefs", {
-        "download.default_directory": os.path.abspath(pasta_download),
         "download.prompt_for_download": False,
         "download.directory_upgrade": True,
         "plugins.always_open_pdf_externally": True
     })
 
-    # Configura o driver do Chrome automaticamente com as opções
-    service = ChromeService(ChromeDriverManager().install())
+    service = ChromeService(caminho_chromedriver())
     driver = webdriver.Chrome(service=service, options=chrome_options)
-    driver.maximize_window()
-    wait = WebDriverWait(driver, 20)
-    
-    arquivos_antes = os.listdir(pasta_download)
+    if not headless:
+        driver.maximize_window()
+    return driver
+
+
+def _configurar_pasta_download(driver: webdriver.Chrome, pasta_download: str):
+    # Troca a pasta de download de um navegador já aberto (também funciona em modo headless)
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {
+        "behavior": "allow",
+        "downloadPath": os.path.abspath(pasta_download),
+    })
+
+
+class PoolNavegadores:
+    """
+    Mantém até `tamanho` navegadores Chrome abertos e os reaproveita entre buscas,
+    evitando pagar a inicialização do navegador (e a resolução do driver) a cada
+    mês/estado. Os navegadores só são abertos quando necessários.
+
+    Uso:
+        with PoolNavegadores(tamanho=2) as pool:
+            baixar_editais_por_mes(..., pool=pool)
+    """
 
+    def __init__(self, tamanho: int = 2, headless: bool = True):
+        self.tamanho = tamanho
+        self.headless = headless
+        self._livres: "queue.LifoQueue[webdriver.Chrome]" = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(tamanho)
+        self._abertos = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fechar()
+
+    def _pegar_livre(self) -> Optional[webdriver.Chrome]:
+        while True:
+            try:
+                driver = self._livres.get_nowait()
+            except queue.Empty:
+                return None
+            try:
+                driver.current_url  # confirma que a sessão ainda responde
+                return driver
+            except WebDriverException:
+                self._descartar(driver)
+
+    def _descartar(self, driver: webdriver.Chrome):
+        with self._lock:
+            self._abertos.discard(driver)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    @contextmanager
+    def obter(self, pasta_download: str):
+        """
+        Empresta um navegador configurado para baixar em `pasta_download`. Se o uso
+        terminar com um erro do próprio navegador (WebDriverException), ele é fechado em
+        vez de voltar para o pool; com os demais erros (ex: BuscaSemResultado) a sessão
+        continua válida e é reaproveitada.
+        """
+        self._vagas.acquire()
+        driver = None
+        try:
+            driver = self._pegar_livre()
+            if driver is None:
+                log_detalhado("Abrindo um novo navegador...")
+                with metricas.medir("driver_inicio"):
+                    driver = _criar_driver(self.headless)
+                with self._lock:
+                    self._abertos.add(driver)
+            _configurar_pasta_download(driver, pasta_download)
+            yield driver
+        except WebDriverException:
+            if driver is not None:
+                self._descartar(driver)
+                driver = None
+            raise
+        finally:
+            if driver is not None:
+                self._livres.put(driver)
+            self._vagas.release()
+
+    def fechar(self):
+        print("Fechando os navegadores.")
+        with self._lock:
+            abertos, self._abertos = list(self._abertos), set()
+        for driver in abertos:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+def baixar_editais_por_mes(
+    ano: int,
+    mes_texto: str,
+    estado_sigla: str,
+    pasta_download: str,
+    arquivos_existentes: list,
+    pool: Optional[PoolNavegadores] = None,
+    baixador: Optional[BaixadorHTTP] = None,
+    ignorar_erros: bool = True,
+) -> List[DownloadConcluido]:
+    """
+    Navega no site da Caixa, preenche o formulário e baixa TODOS os editais de um
+    determinado mês, ano e estado. Retorna os downloads concluídos (nome, tamanho e
+    duração de cada arquivo).
+
+    `arquivos_existentes` são os editais já baixados para este mês e estado (ex: os
+    registrados no checkpoint do período, ver planejador_backfill). Se todos ainda
+    estiverem na pasta, a busca não é feita. Os nomes dos editais da Caixa (ex:
+    EL00580225CPARE.pdf) não indicam o estado, então o período não pode ser deduzido
+    dos arquivos da pasta.
+
+    Com `pool`, usa um navegador já aberto do pool; sem ele, abre um navegador só
+    para esta busca e o fecha ao final.
+
+    Com `baixador`, os PDFs são baixados por HTTP, sem clicar nos links: a busca é
+    feita pelo próprio baixador e o navegador só é usado para descobrir as URLs se o
+    formulário não puder ser reproduzido.
+
+    Erros na busca são exibidos e a função retorna o que foi baixado; com
+    `ignorar_erros=False` eles são levantados, assim como DownloadIncompleto quando
+    algum dos editais encontrados não foi baixado.
+    """
+    # Garante que a pasta de download existe
+    if not os.path.exists(pasta_download):
+        os.makedirs(pasta_download)
+
+    # Verifica se os arquivos já baixados para esse período continuam na pasta
+    if arquivos_existentes and all(os.path.exists(os.path.join(pasta_download, f)) for f in arquivos_existentes):
+        print(f"Arquivos para {mes_texto}/{ano} de {estado_sigla} já foram baixados. Ignorando download.")
+        metricas.incrementar("automacao_arquivos_ignorados_total", motivo="ja_baixado")
+        return []
+
+    # Cada busca baixa em uma pasta própria, para que buscas em paralelo não confundam
+    # os arquivos umas das outras; ao final eles são movidos para a pasta de download
+    pasta_temporaria = os.path.join(pasta_download, f".baixando_{ano}_{mes_texto}_{estado_sigla}")
+    os.makedirs(pasta_temporaria, exist_ok=True)
+
+    concluidos, encontrados = [], 0
     try:
-        print("Iniciando o scraper...")
-        
+        if baixador is not None:
+            concluidos, encontrados = _baixar_editais_http(
+                baixador, pool, ano, mes_texto, estado_sigla, pasta_download, pasta_temporaria
+            )
+        else:
+            with (nullcontext(pool) if pool else PoolNavegadores(tamanho=1)) as pool_busca:
+                with pool_busca.obter(pasta_temporaria) as driver:
+                    concluidos, encontrados = _baixar_editais(driver, ano, mes_texto, estado_sigla, pasta_temporaria)
+    except BuscaSemResultado as e:
+        # Não é uma falha: meses sem editais são comuns
+        print(e)
+        if not ignorar_erros:
+            raise
+    except Exception as e:
+        print(f"Ocorreu um erro durante a execução: {e}")
+        metricas.incrementar("automacao_falhas_total", etapa="download")
+        if not ignorar_erros:
+            raise
+    finally:
+        for nome_arquivo in os.listdir(pasta_temporaria):
+            if not nome_arquivo.endswith('.crdownload'):
+                shutil.move(os.path.join(pasta_temporaria, nome_arquivo), os.path.join(pasta_download, nome_arquivo))
+        shutil.rmtree(pasta_temporaria, ignore_errors=True)
+    for download in concluidos:
+        metricas.observar("download", download.duracao_segundos)
+    if len(concluidos) < encontrados and not ignorar_erros:
+        raise DownloadIncompleto(
+            f"{len(concluidos)} de {encontrados} edital(is) de {mes_texto}/{ano} de {estado_sigla} baixado(s)."
+        )
+    return concluidos
+
+
+def _selecionar_opcao(wait: WebDriverWait, nome_campo: str, texto: Optional[str] = None, valor: Optional[str] = None):
+    """
+    Seleciona uma opção do combo assim que ela estiver disponível (alguns combos do
+    formulário são preenchidos pela página depois do carregamento).
+    """
+    def opcao_disponivel(driver):
+        combo = Select(driver.find_element(By.NAME, nome_campo))
+        opcoes = [(opcao.text.strip(), opcao.get_attribute("value")) for opcao in combo.options]
+        if any(t == texto or v == valor for t, v in opcoes):
+            return combo
+        return False
+
+    combo = wait.until(opcao_disponivel)
+    if valor is not None:
+        combo.select_by_value(valor)
+    else:
+        combo.select_by_visible_text(texto)
+
+
+def _buscar_documentos(driver: webdriver.Chrome, ano: int, mes_texto: str, estado_sigla: str):
+    """
+    Preenche o formulário de busca e espera pelos resultados. Levanta BuscaSemResultado
+    se nenhum link de edital aparecer no tempo de espera.
+    """
+    wait = WebDriverWait(driver, 20)
+
+    log_detalhado("Iniciando o scraper...")
+
+    with metricas.medir("formulario_envio"):
         # 1. Acessar a página alvo
-        print(f"Acessando a URL: {URL}")
+        log_detalhado(f"Acessando a URL: {URL}")
         driver.get(URL)
-        
+
         # 2. Preencher o formulário de busca
         wait.until(EC.presence_of_element_located((By.NAME, "cmb_tipo_documento")))
-        print("Preenchendo o formulário de busca...")
-        
-        Select(driver.find_element(By.NAME, "cmb_tipo_documento")).select_by_visible_text("Edital de Publicação do Leilão SFI - Edital Único")
-        Select(driver.find_element(By.NAME, "cmb_estado")).select_by_value(estado_sigla)
-        Select(driver.find_element(By.NAME, "cmb_mes_referencia")).select_by_visible_text(mes_texto)
-        Select(driver.find_element(By.NAME, "cmb_ano_referencia")).select_by_visible_text(str(ano))
-        
-        time.sleep(3)
+        log_detalhado("Preenchendo o formulário de busca...")
+
+        _selecionar_opcao(wait, "cmb_tipo_documento", texto=TIPO_DOCUMENTO)
+        _selecionar_opcao(wait, "cmb_estado", valor=estado_sigla)
+        _selecionar_opcao(wait, "cmb_mes_referencia", texto=mes_texto)
+        _selecionar_opcao(wait, "cmb_ano_referencia", texto=str(ano))
 
         # 3. Clicar no botão "Próximo"
-        print("Clicando em 'Próximo' para buscar os documentos...")
-        driver.find_element(By.ID, "btn_next0").click()
-        
-        time.sleep(3)
-
-        # ------------------- INÍCIO DA SUBSTITUIÇÃO -------------------
-        # 4. Encontrar e clicar em TODOS os botões de edital para iniciar os downloads
-        print("Aguardando os resultados da busca...")
-        texto_do_botao_azul = "Edital de Publicação do Leilão SFI"
-        
+        log_detalhado("Clicando em 'Próximo' para buscar os documentos...")
+        wait.until(EC.element_to_be_clickable((By.ID, "btn_next0"))).click()
+
+        log_detalhado("Aguardando os resultados da busca...")
         try:
             # Espera até que pelo menos UM link de edital esteja visível
-            wait.until(EC.visibility_of_element_located((By.PARTIAL_LINK_TEXT, texto_do_botao_azul)))
-            
-            # Encontra TODOS os elementos (links) que contêm o texto do edital
+            wait.until(EC.visibility_of_element_located((By.PARTIAL_LINK_TEXT, TEXTO_LINK_EDITAL)))
+        except TimeoutException:
+            raise BuscaSemResultado(f"Nenhum edital apareceu na busca de {mes_texto}/{ano} de {estado_sigla}.")
+
+
+def _baixar_editais(
+    driver: webdriver.Chrome, ano: int, mes_texto: str, estado_sigla: str, pasta_download: str
+) -> Tuple[List[DownloadConcluido], int]:
+    # Retorna os downloads concluídos e quantos editais a busca encontrou
+    _buscar_documentos(driver, ano, mes_texto, estado_sigla)
+
+    # 4. Encontrar e clicar em TODOS os botões de edital para iniciar os downloads
+    texto_do_botao_azul = TEXTO_LINK_EDITAL
+
+    # Encontra TODOS os elementos (links) que contêm o texto do edital
+    botoes_edital = driver.find_elements(By.PARTIAL_LINK_TEXT, texto_do_botao_azul)
+    num_editais = len(botoes_edital)
+    print(f"{num_editais} edital(is) encontrado(s). Iniciando downloads...")
+
+    with RastreadorDownloads(pasta_download) as rastreador:
+        # Itera (faz um loop) sobre cada botão encontrado para clicar e baixar
+        for i in range(num_editais):
+            # É crucial encontrar os elementos novamente dentro do loop,
+            # pois a página pode ser alterada após um clique.
             botoes_edital = driver.find_elements(By.PARTIAL_LINK_TEXT, texto_do_botao_azul)
+            botao_atual = botoes_edital[i]
             
-            num_editais = len(botoes_edital)
-            print(f"{num_editais} edital(is) encontrado(s). Iniciando downloads...")
-
-            # Itera (faz um loop) sobre cada botão encontrado para clicar e baixar
-            for i in range(num_editais):
-                # É crucial encontrar os elementos novamente dentro do loop,
-                # pois a página pode ser alterada após um clique.
-                botoes_edital = driver.find_elements(By.PARTIAL_LINK_TEXT, texto_do_botao_azul)
-                botao_atual = botoes_edital[i]
-                
-                print(f"Baixando edital {i + 1}/{num_editais}: '{botao_atual.text}'")
-                botao_atual.click()
-                # Pausa para dar tempo ao início do download antes de prosseguir para o próximo
-                time.sleep(5) 
-
-            print("Aguardando a conclusão de todos os downloads...")
-            tempo_limite = time.time() + 120  # Aumenta o tempo limite para múltiplos arquivos
-            
-            while time.time() < tempo_limite:
-                arquivos_depois = os.listdir(pasta_download)
-                novos_arquivos = [f for f in arquivos_depois if f not in arquivos_antes and not f.endswith('.crdownload')]
-                
-                # Verifica se o número de novos arquivos é igual ao número de editais encontrados
-                if len(novos_arquivos) == num_editais:
-                    print(f"Download de {len(novos_arquivos)} arquivo(s) concluído(s): {', '.join(novos_arquivos)}")
-                    break
-                time.sleep(3)
+            log_detalhado(f"Baixando edital {i + 1}/{num_editais}: '{botao_atual.text}'")
+            rastreador.registrar_pedido()
+            botao_atual.click()
+            # Só segue para o próximo link quando o download deste já começou
+            if not rastreador.aguardar_inicio(i + 1, timeout=TIMEOUT_INICIO_DOWNLOAD):
+                print(f"AVISO: O download do edital {i + 1} não começou em {TIMEOUT_INICIO_DOWNLOAD}s.")
 
-        except TimeoutException:
-            print(f"Nenhum edital encontrado para {mes_texto}/{ano} de {estado_sigla}.")
+        log_detalhado("Aguardando a conclusão de todos os downloads...")
+        concluidos = rastreador.aguardar_conclusao(num_editais, timeout=TIMEOUT_DOWNLOADS)
+
+    for download in concluidos:
+        log_detalhado(f"  - {download.nome}: {download.tamanho_bytes / 1024:.0f} KB em {download.duracao_segundos:.1f}s")
+    if len(concluidos) < num_editais:
+        print(f"AVISO: Apenas {len(concluidos)} de {num_editais} download(s) concluído(s) em {TIMEOUT_DOWNLOADS}s.")
+    else:
+        print(f"Download de {len(concluidos)} arquivo(s) concluído(s).")
+    return concluidos, num_editais
+
+
+def _baixar_editais_http(
+    baixador: BaixadorHTTP,
+    pool: Optional[PoolNavegadores],
+    ano: int,
+    mes_texto: str,
+    estado_sigla: str,
+    pasta_download: str,
+    pasta_temporaria: str,
+) -> Tuple[List[DownloadConcluido], int]:
+    print(f"Buscando os editais de {mes_texto}/{ano} de {estado_sigla} por HTTP...")
+    urls = baixador.buscar_urls_editais(ano, mes_texto, estado_sigla)
+    if urls is None:
+        # O navegador só descobre as URLs; o download continua sendo por HTTP
+        print("Não foi possível reproduzir o formulário. Descobrindo os links com o navegador...")
+        with (nullcontext(pool) if pool else PoolNavegadores(tamanho=1)) as pool_busca:
+            with pool_busca.obter(pasta_temporaria) as driver:
+                _buscar_documentos(driver, ano, mes_texto, estado_sigla)
+                urls = extrair_links_editais(driver.page_source, driver.current_url)
+                baixador.importar_cookies(driver.get_cookies())
+
+    if not urls:
+        print(f"Nenhum edital encontrado para {mes_texto}/{ano} de {estado_sigla}.")
+        return [], 0
+    urls = list(dict.fromkeys(urls))
+    print(f"{len(urls)} edital(is) encontrado(s). Baixando por HTTP...")
+    # Os parciais ficam fora da pasta temporária, para serem retomados numa próxima execução
+    concluidos = baixador.baixar(urls, pasta_temporaria, pasta_parciais=os.path.join(pasta_download, PASTA_PARCIAIS_HTTP))
+    return concluidos, len(urls)
 
-        # ------------------- FIM DA SUBSTITUIÇÃO -------------------
-            
-    except Exception as e:
-        print(f"Ocorreu um erro durante a execução: {e}")
-    finally:
-        print("Fechando o navegador.")
-        driver.quit()
\ No newline at end of file